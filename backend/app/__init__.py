@@ -1,3 +1,9 @@
-from .main import app
-
 __all__ = ["app"]
+
+
+def __getattr__(name):
+    # Resolve ``app`` lazily so scripts can import ``app.services.*`` without the web stack.
+    if name == "app":
+        from .main import app
+        return app
+    raise AttributeError(name)
@@ -1,4 +1,5 @@
 import os
+import asyncio
 
 from app.core.config import make_app
 from app.routes import (
@@ -12,6 +13,9 @@ from app.routes import (
     symbols,
     patterns,
 )
+from app.services.model_registry import registry as model_registry
+from app.services.retrain import retrain_scheduler, RETRAIN_ENABLED
+from app.services.backtest import shutdown_step_pool
 
 app = make_app()
 
@@ -26,6 +30,21 @@ app.include_router(symbols.router)
 app.include_router(patterns.router)
 
 
+@app.on_event("startup")
+async def warm_models():
+    # Deserialize the global LSTM once so the first forecast doesn't pay for it.
+    if os.getenv("PRELOAD_MODELS", "1") == "1":
+        await asyncio.to_thread(model_registry.warm)
+    if RETRAIN_ENABLED:
+        retrain_scheduler.start()
+
+
+@app.on_event("shutdown")
+async def stop_workers():
+    # The parallel backtest pool is spawned lazily; don't leave its processes behind.
+    shutdown_step_pool()
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -1,46 +1,145 @@
+import json
+import time
 import asyncio
+import threading
 import uuid
+from concurrent.futures import Future
+from typing import Dict, Literal, Set, Union
 from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from app.schemas import BacktestRunIn, BacktestStatus, BacktestResult
+from app.schemas import BacktestRunIn, BacktestStatus, BacktestResult, BacktestOut
 from app.services.backtest import simulate_backtest, run_backtest, run_backtest_last
+from app.services.jobs import JobStore, TERMINAL
+from app.services.executor import backtest_executor, QueueFull
 
 router = APIRouter()
 
-jobs: dict[str, BacktestStatus | dict] = {}
+jobs = JobStore("backtest")
+_job_futures: Dict[str, Future] = {}
+_tasks: Set[asyncio.Task] = set()
 
+STREAM_POLL_S = 0.5
+
+
+def _progress(pct: float, info: dict | None, t0: float) -> dict:
+    entry = {"state": "running", "pct": int(pct)}
+    if pct > 0:
+        entry["etaSeconds"] = int(round((time.monotonic() - t0) * (100 - pct) / pct))
+    if info:
+        entry.update({k: v for k, v in info.items() if v is not None})
+        msg = f"step {info['step']}/{info['steps']}"
+        if info.get("epoch") is not None:
+            msg += f", epoch {info['epoch']}/{info['epochs']}"
+        entry["message"] = msg
+    return entry
 
-async def _run_job(job_id: str, payload: BacktestRunIn):
-    try:
-        jobs[job_id] = {"state": "running", "pct": 0}
 
-        def cb(p):
-            jobs[job_id] = {"state": "running", "pct": int(p)}
+def _too_busy(e: QueueFull) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Backtest queue is full, retry later",
+        headers={"Retry-After": str(max(1, e.retry_after))},
+    )
 
-        result = await asyncio.to_thread(simulate_backtest, payload, cb)
+
+async def _run_job(job_id: str, fut: Future):
+    try:
+        result = await asyncio.wrap_future(fut)
         jobs[job_id] = {"state": "done", "pct": 100, "result": result}
     except Exception as e:
         jobs[job_id] = {"state": "error", "pct": 100, "message": str(e)}
+    finally:
+        _job_futures.pop(job_id, None)
+
+
+def _start_job(fn, *args) -> tuple[str, asyncio.Task]:
+    """Queue ``fn`` on the backtest executor (raises 429 when it is full) and track it as a job."""
+    job_id = uuid.uuid4().hex
+    t0 = time.monotonic()
+    queued = threading.Lock()   # a worker that picks the job up at once waits for the "queued" entry
+
+    def cb(p, info=None):
+        jobs[job_id] = _progress(p, info, t0)
+
+    def work():
+        nonlocal t0
+        with queued:
+            t0 = time.monotonic()   # ETA from when it started running, not from when it was queued
+            jobs[job_id] = {"state": "running", "pct": 0}
+        return fn(*args, progress_cb=cb)
+
+    with queued:
+        try:
+            fut = backtest_executor.submit(work)
+        except QueueFull as e:
+            raise _too_busy(e)
+        jobs[job_id] = {"state": "queued", "pct": 0}
+        _job_futures[job_id] = fut
+    task = asyncio.create_task(_run_job(job_id, fut))
+    _tasks.add(task)   # the loop only keeps a weak reference to running tasks
+    task.add_done_callback(_tasks.discard)
+    return job_id, task
+
+
+async def _accepted_or_result(job_id: str, task: asyncio.Task, wait: bool):
+    if not wait:
+        return JSONResponse({"jobId": job_id}, status_code=202)
+    await asyncio.shield(task)   # a dropped client doesn't cancel the bookkeeping
+    st = jobs.get(job_id)
+    if not st or st.get("state") != "done":
+        raise HTTPException(400, (st or {}).get("message", "Backtest failed"))
+    return st["result"]
 
 
 @router.post("/backtest/run")
 async def start_backtest(payload: BacktestRunIn):
-    job_id = uuid.uuid4().hex
-    jobs[job_id] = {"state": "queued", "pct": 0}
-    asyncio.create_task(_run_job(job_id, payload))
+    job_id, _ = _start_job(simulate_backtest, payload)
     return JSONResponse({"jobId": job_id}, status_code=202)
 
 
+def _status(job_id: str) -> dict | None:
+    st = jobs.peek(job_id)
+    fut = _job_futures.get(job_id)
+    if st is None or fut is None or st.get("state") != "queued":
+        return st
+    return {**st, **backtest_executor.position(fut)}
+
+
 @router.get("/backtest/status", response_model=BacktestStatus)
 async def job_status(jobId: str = Query(...)):
-    st = jobs.get(jobId)
+    st = _status(jobId)
     if not st:
         raise HTTPException(404, "Unknown jobId")
     return st
 
 
-@router.get("/backtest/result", response_model=BacktestResult)
+@router.get("/backtest/stream")
+async def job_stream(jobId: str = Query(...)):
+    """Server-sent events: one ``data:`` line per status change until the job finishes."""
+    if jobId not in jobs:
+        raise HTTPException(404, "Unknown jobId")
+
+    async def events():
+        last = None
+        while True:
+            st = _status(jobId)
+            if st is None:
+                yield f"data: {json.dumps({'state': 'error', 'message': 'Job expired'})}\n\n"
+                return
+            status = BacktestStatus(**st).model_dump(exclude_none=True)
+            if status != last:
+                yield f"data: {json.dumps(status)}\n\n"
+                last = status
+            if st.get("state") in TERMINAL:
+                return
+            await asyncio.sleep(STREAM_POLL_S)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/backtest/result", response_model=Union[BacktestResult, BacktestOut])
 async def job_result(jobId: str = Query(...)):
     st = jobs.get(jobId)
     if not st or st.get("state") != "done" or "result" not in st:
@@ -54,14 +153,13 @@ async def lstm_backtest(
     horizon: int = Query(..., ge=1, le=30),
     start: str = Query(...),
     end: str | None = None,
+    warm_start: bool = Query(False, description="reuse one model across walk-forward steps"),
+    parallel: bool = Query(False, description="train the walk-forward steps on a process pool"),
+    mode: Literal["ticker", "global"] = Query("ticker", description="global: score with the pretrained global model"),
+    wait: bool = Query(False, description="opt in to blocking until done and returning the result instead of a jobId"),
 ):
-    try:
-        result = await asyncio.to_thread(
-            run_backtest, ticker, look_back, horizon, start, end
-        )
-    except Exception as e:
-        raise HTTPException(400, str(e))
-    return result
+    job_id, task = _start_job(run_backtest, ticker, look_back, horizon, start, end, warm_start, parallel, mode)
+    return await _accepted_or_result(job_id, task, wait)
 
 
 @router.get("/backtest/accuracy")
@@ -69,10 +167,8 @@ async def accuracy_backtest(
     ticker: str,
     look_back: int = Query(90, ge=30, le=240),
     horizon: int = Query(10, ge=1, le=30),
+    mode: Literal["ticker", "global"] = Query("ticker", description="global: score with the pretrained global model"),
+    wait: bool = Query(False, description="opt in to blocking until done and returning the result instead of a jobId"),
 ):
-    try:
-        result = await asyncio.to_thread(run_backtest_last, ticker, look_back, horizon)
-    except Exception as e:
-        raise HTTPException(400, str(e))
-    return result
-
+    job_id, task = _start_job(run_backtest_last, ticker, look_back, horizon, mode)
+    return await _accepted_or_result(job_id, task, wait)
@@ -1,6 +1,7 @@
-import yfinance as yf
 from fastapi import APIRouter, HTTPException, Query
 
+from app.services.price_store import price_store
+
 router = APIRouter()
 
 
@@ -12,7 +13,7 @@ def chart(ticker: str, range: str = Query("1y"), interval: str = Query("1d")):
             "1y": "1y","2y": "2y","5y": "5y","10y": "10y","ytd": "ytd","max": "max",
         }
         period = period_map.get(range, "1y")
-        df = yf.Ticker(ticker.upper()).history(period=period, interval=interval)
+        df = price_store.get(ticker, interval=interval, period=period)
         if df.empty:
             raise HTTPException(status_code=404, detail="No chart data")
         tz = None
@@ -35,6 +36,7 @@ def chart(ticker: str, range: str = Query("1y"), interval: str = Query("1d")):
             "interval": interval,
             "timezone": tz,
             "series": out,
+            "freshness": price_store.freshness(ticker, interval),
         }
     except Exception as e:
         raise HTTPException(status_code=503, detail=str(e))
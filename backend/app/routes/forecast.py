@@ -1,19 +1,27 @@
 # app/routes/forecast.py
 from __future__ import annotations
 
-import os
-import json
-import tempfile
 import asyncio
+import threading
 import uuid
+from concurrent.futures import Future
 from typing import Any, Dict, List
 
-import papermill as pm
 from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 
-NOTEBOOK_PATH = os.getenv("NOTEBOOK_PATH", "notebooks/Stock_LSTM_10day.ipynb")
+from app.services.forecast import run_forecast, run_forecast_batch, ModelNotReady
+from app.services.global_model import ARTIFACTS_DIR
+from app.services.model_registry import registry
+from app.services.forecast_cache import forecast_cache
+from app.services.singleflight import SingleFlight
+from app.services.executor import forecast_executor, backtest_executor, QueueFull
+from app.services.jobs import JobStore
+from app.services.retrain import retrain_scheduler
+from app.services.price_store import price_store
+from app.services.feature_cache import feature_cache
+from app.services.model_cache import model_cache
 
 router = APIRouter()
 
@@ -28,6 +36,13 @@ class PredictIn(BaseModel):
     context: int = Field(100, ge=30, le=365)
     backtest_horizon: int = Field(20, ge=1, le=90)
 
+class BatchPredictIn(BaseModel):
+    tickers: List[str] = Field(..., min_length=1, max_length=500)
+    look_back: int = Field(60, ge=10, le=365)
+    horizon: int = Field(10, ge=1, le=60)
+    context: int = Field(100, ge=30, le=365)
+    backtest_horizon: int = Field(20, ge=1, le=90)
+
 class ForecastOut(BaseModel):
     ticker: str
     look_back: int
@@ -37,14 +52,22 @@ class ForecastOut(BaseModel):
     metrics: Dict[str, float]
     forecast: List[Dict[str, Any]]
 
+class BatchForecastOut(BaseModel):
+    look_back: int
+    context: int
+    backtest_horizon: int
+    horizon: int
+    results: Dict[str, ForecastOut]
+    errors: Dict[str, str]
+
 # ---------------------------
 # Job storage (optional async flow)
 # ---------------------------
 
-jobs: dict[str, dict] = {}
+jobs = JobStore("forecast")
 
 # ---------------------------
-# Notebook runner
+# Forecast runner
 # ---------------------------
 
 def run_forecast_blocking(
@@ -55,77 +78,118 @@ def run_forecast_blocking(
     horizon: int
 ) -> Dict[str, Any]:
     """
-    Executes the parameterized notebook and returns its JSON result.
+    Runs the in-process forecast engine and returns the ForecastOut payload.
     """
-    if not os.path.exists(NOTEBOOK_PATH):
-        raise RuntimeError(f"Notebook not found: {NOTEBOOK_PATH}")
-
-    with tempfile.TemporaryDirectory() as tmp:
-        out_nb = os.path.join(tmp, "out.ipynb")
-        out_json = os.path.join(tmp, "forecast.json")
-
-        params = {
-            "TICKER": ticker,
-            "LOOKBACK": look_back,
-            "CONTEXT": context,
-            "BACKTEST_HORIZON": backtest_horizon,
-            "HORIZON": horizon,
-            "OUTPUT_JSON": out_json,
-        }
-
-        try:
-            pm.execute_notebook(
-                NOTEBOOK_PATH,
-                out_nb,
-                parameters=params,
-                kernel_name="python3",
-                progress=False,
-            )
-        except Exception as e:
-            raise RuntimeError(f"Notebook failed to execute: {e}")
-
-        if not os.path.exists(out_json):
-            raise RuntimeError(
-                "Notebook completed but OUTPUT_JSON not found.\n"
-                "Make sure the notebook writes a JSON file at OUTPUT_JSON."
-            )
-
-        with open(out_json) as f:
-            data = json.load(f)
-
-        # light validation
-        required_top = ["ticker", "look_back", "context", "backtest_horizon", "horizon", "metrics", "forecast"]
-        missing = [k for k in required_top if k not in data]
-        if missing:
-            raise RuntimeError(f"Notebook JSON missing keys: {missing}")
-
-        return data
-
-async def _run_job(job_id: str, payload: PredictIn):
+    return run_forecast(ticker, look_back, context, backtest_horizon, horizon)
+
+# Identical requests share one computation; each caller keeps its own job entry.
+_flight = SingleFlight()
+_job_futures: dict[str, Future] = {}
+_waiters: dict[int, int] = {}
+_tasks: set[asyncio.Task] = set()
+# job ids waiting on each computation, so they can be marked running when a worker starts it
+_flight_jobs: dict[tuple, set[str]] = {}
+_flight_started: set[tuple] = set()
+_flight_lock = threading.Lock()
+
+def _run_flight(key: tuple, *args) -> Dict[str, Any]:
+    with _flight_lock:
+        _flight_started.add(key)
+        for job_id in _flight_jobs.get(key, ()):
+            if (jobs.peek(job_id) or {}).get("state") == "queued":
+                jobs[job_id] = {"state": "running"}
     try:
-        jobs[job_id] = {"state": "running", "progress": 0}
-        result = await asyncio.to_thread(
-            run_forecast_blocking,
-            payload.ticker.upper(),
-            payload.look_back,
-            payload.context,
-            payload.backtest_horizon,
-            payload.horizon,
-        )
-        jobs[job_id] = {"state": "done", "result": result}
+        return run_forecast_blocking(*args)
+    finally:
+        with _flight_lock:
+            _flight_started.discard(key)
+
+def submit_forecast(
+    ticker: str,
+    look_back: int,
+    context: int,
+    backtest_horizon: int,
+    horizon: int
+) -> Future:
+    """Join or start a forecast on the bounded executor (raises QueueFull when saturated)."""
+    key = (ticker, look_back, context, backtest_horizon, horizon)
+    return _flight.join(
+        key,
+        lambda: forecast_executor.submit(_run_flight, key, ticker, look_back, context, backtest_horizon, horizon),
+    )
+
+def _attach(fut: Future):
+    _waiters[id(fut)] = _waiters.get(id(fut), 0) + 1
+
+def _detach(fut: Future) -> int:
+    left = _waiters.get(id(fut), 1) - 1
+    if left <= 0:
+        _waiters.pop(id(fut), None)
+    else:
+        _waiters[id(fut)] = left
+    return left
+
+def _too_busy(e: QueueFull) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Forecast queue is full, retry later",
+        headers={"Retry-After": str(max(1, e.retry_after))},
+    )
+
+def _not_ready(e: ModelNotReady) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "60"})
+
+async def _run_job(job_id: str, key: tuple, fut: Future):
+    try:
+        result = await asyncio.wrap_future(fut)
+        if (jobs.peek(job_id) or {}).get("state") != "cancelled":
+            jobs[job_id] = {"state": "done", "result": result}
+    except asyncio.CancelledError:
+        jobs[job_id] = {"state": "cancelled"}
     except Exception as e:
         jobs[job_id] = {"state": "error", "message": str(e)}
+    finally:
+        if _job_futures.pop(job_id, None) is not None:
+            _detach(fut)
+        with _flight_lock:
+            waiting = _flight_jobs.get(key)
+            if waiting is not None:
+                waiting.discard(job_id)
+                if not waiting:
+                    del _flight_jobs[key]
 
 def create_job(payload: PredictIn) -> str:
+    key = (payload.ticker.upper(), payload.look_back, payload.context, payload.backtest_horizon, payload.horizon)
     job_id = uuid.uuid4().hex
-    jobs[job_id] = {"state": "queued"}
-    asyncio.create_task(_run_job(job_id, payload))
+    with _flight_lock:   # _run_flight can't mark the job running before it is registered
+        fut = submit_forecast(*key)
+        jobs[job_id] = {"state": "running" if key in _flight_started else "queued"}
+        _flight_jobs.setdefault(key, set()).add(job_id)
+    _job_futures[job_id] = fut
+    _attach(fut)
+    task = asyncio.create_task(_run_job(job_id, key, fut))
+    _tasks.add(task)   # the loop only keeps a weak reference to running tasks
+    task.add_done_callback(_tasks.discard)
     return job_id
 
+def cancel_job(job_id: str) -> bool:
+    """Cancel a queued/running job; the shared computation stops only if nobody else waits on it."""
+    fut = _job_futures.pop(job_id, None)
+    if fut is None:
+        return False
+    jobs[job_id] = {"state": "cancelled"}
+    if _detach(fut) == 0:
+        forecast_executor.cancel(fut)
+    return True
+
 def get_job_status(job_id: str | None):
     if not job_id:
         return None
-    return jobs.get(job_id)
+    fut = _job_futures.get(job_id)
+    st = jobs.get(job_id)
+    if st is None or fut is None or st["state"] not in ("queued", "running"):
+        return st
+    return {**st, **forecast_executor.position(fut)}
 
 # ---------------------------
 # Routes
@@ -135,14 +199,35 @@ def get_job_status(job_id: str | None):
 def health():
     return {
         "status": "ok",
-        "notebook": NOTEBOOK_PATH,
+        "artifacts": str(ARTIFACTS_DIR),
+        "models": registry.stats(),
+        "forecastCache": forecast_cache.stats(),
+        "inflight": _flight.stats(),
+        "executor": forecast_executor.stats(),
+        "backtestExecutor": backtest_executor.stats(),
+        "jobs": JobStore.all_stats(),
+        "retrain": retrain_scheduler.stats(),
+        "priceStore": price_store.stats(),
+        "featureCache": feature_cache.stats(),
+        "backtestModelCache": model_cache.stats(),
     }
 
 @router.post("/predict")
 async def start_prediction(payload: PredictIn):
-    job_id = create_job(payload)
+    try:
+        job_id = create_job(payload)
+    except QueueFull as e:
+        raise _too_busy(e)
     return JSONResponse({"jobId": job_id}, status_code=202)
 
+@router.delete("/predict/{job_id}")
+async def cancel_prediction(job_id: str):
+    if job_id not in jobs:
+        raise HTTPException(status_code=404, detail="Unknown jobId")
+    if not cancel_job(job_id):
+        raise HTTPException(status_code=409, detail=f"Job already {jobs.peek(job_id)['state']}")
+    return {"jobId": job_id, "state": "cancelled"}
+
 @router.get("/status")
 async def status(req: Request):
     qp = req.query_params
@@ -163,10 +248,36 @@ def forecast(
     horizon: int = Query(10, ge=1, le=60),
 ):
     try:
-        data = run_forecast_blocking(
-            ticker.upper(), look_back, context, backtest_horizon, horizon
-        )
+        fut = submit_forecast(ticker.upper(), look_back, context, backtest_horizon, horizon)
+    except QueueFull as e:
+        raise _too_busy(e)
+    _attach(fut)
+    try:
         # FastAPI will validate against ForecastOut and serialize
-        return data
+        return fut.result()
+    except ModelNotReady as e:
+        raise _not_ready(e)
+    except Exception as e:
+        raise HTTPException(500, f"Forecast failed: {e}")
+    finally:
+        _detach(fut)
+
+@router.post("/forecast/batch", response_model=BatchForecastOut)
+async def forecast_batch(payload: BatchPredictIn):
+    try:
+        fut = forecast_executor.submit(
+            run_forecast_batch,
+            payload.tickers,
+            payload.look_back,
+            payload.context,
+            payload.backtest_horizon,
+            payload.horizon,
+        )
+    except QueueFull as e:
+        raise _too_busy(e)
+    try:
+        return await asyncio.wrap_future(fut)
+    except ModelNotReady as e:
+        raise _not_ready(e)
     except Exception as e:
-        raise HTTPException(500, f"Notebook failed: {e}")
+        raise HTTPException(500, f"Batch forecast failed: {e}")
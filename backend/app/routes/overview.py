@@ -1,14 +1,16 @@
-import yfinance as yf
 from fastapi import APIRouter, HTTPException
 
+from app.services.price_provider import provider
+from app.services.price_store import price_store
+
 router = APIRouter()
 
 
 @router.get("/overview/{ticker}")
 def overview(ticker: str):
     try:
-        t = yf.Ticker(ticker.upper())
-        fi = getattr(t, "fast_info", {}) or {}
+        quote = provider.quote(ticker)
+        fi = quote["fast_info"]
 
         price = fi.get("last_price") or fi.get("last_close") or fi.get("regular_market_price")
         prev = fi.get("previous_close") or fi.get("last_close")
@@ -18,24 +20,21 @@ def overview(ticker: str):
         pe_ratio = None
 
         if not price or price == 0:
-            hist = t.history(period="2d", interval="1d")
+            hist = price_store.get(ticker, interval="1d", period="2d")
             if not hist.empty:
                 price = float(hist["Close"].iloc[-1])
                 if len(hist) > 1:
                     prev = float(hist["Close"].iloc[-2])
 
         if day_low is None or day_high is None:
-            intraday = t.history(period="1d", interval="1m")
+            intraday = price_store.get(ticker, interval="1m", period="1d")
             if not intraday.empty:
                 day_low = float(intraday["Low"].min())
                 day_high = float(intraday["High"].max())
 
-        try:
-            info = t.info or {}
-            pe_ratio = info.get("trailingPE", pe_ratio)
-            market_cap = market_cap or info.get("marketCap")
-        except Exception:
-            pass
+        info = quote["info"]
+        pe_ratio = info.get("trailingPE", pe_ratio)
+        market_cap = market_cap or info.get("marketCap")
 
         change = change_pct = None
         if price is not None and prev is not None:
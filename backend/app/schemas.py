@@ -29,12 +29,27 @@ class BacktestMetrics(BaseModel):
     cumulative_return: float
 
 
+class BacktestStep(BaseModel):
+    date: str
+    trainSeconds: float
+    epochs: int
+    samples: int
+
+
+class BacktestTiming(BaseModel):
+    mode: Literal["cold", "warm", "parallel", "global"]
+    trainSeconds: float
+    totalSeconds: float
+
+
 class BacktestOut(BaseModel):
     ticker: str
     look_back: int
     horizon: int
     metrics: BacktestMetrics
     results: list[BacktestPoint]
+    steps: list[BacktestStep] = []
+    timing: Optional[BacktestTiming] = None
 
 
 # --- new strategy backtest schemas ---
@@ -109,5 +124,11 @@ class BacktestStatus(BaseModel):
     state: Literal["queued", "running", "done", "error"]
     pct: int = 0
     etaSeconds: Optional[int] = None
+    queuePosition: Optional[int] = None
     message: Optional[str] = None
+    # LSTM backtests: walk-forward step and training epoch in progress
+    step: Optional[int] = None
+    steps: Optional[int] = None
+    epoch: Optional[int] = None
+    epochs: Optional[int] = None
 
@@ -1,146 +1,174 @@
 # app/services/backtest.py
 from __future__ import annotations
 
+import os
+import time
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import numpy as np
 import pandas as pd
-import yfinance as yf
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_squared_error, mean_absolute_percentage_error
 import tensorflow as tf
 
+from app.services.price_store import price_store
+from app.services.windows import make_windows, windows_ending_at
+from app.services.features import add_features, FEATURES   # re-exported: older imports go through this module
+from app.services.feature_cache import feature_cache
+from app.services.model_registry import registry
+from app.services.model_cache import model_cache, make_key as make_model_key, FittedModel
+# re-exported: the step code lives apart so pool workers import only what they run
+from app.services.backtest_steps import COLD_EPOCHS, build_model, predict_next, cold_step as _cold_step, init_worker
+
 # -------------------------------
 # Data + feature engineering
 # -------------------------------
 
 def fetch_prices(ticker: str, start="2016-01-01", end=None, interval="1d") -> pd.DataFrame:
-    df = yf.download(ticker, start=start, end=end, interval=interval, auto_adjust=True, progress=False)
+    df = price_store.get(ticker, interval=interval, start=start, end=end)
     if df.empty:
         raise ValueError("No data returned. Check ticker/interval or your network.")
-    df.index.name = "Date"
     return df[["Open", "High", "Low", "Close", "Volume"]].dropna()
 
-def add_features(df: pd.DataFrame) -> pd.DataFrame:
-    out = df.copy()
-    close = pd.to_numeric(out["Close"].squeeze(), errors="coerce")
-    close = close.where(close > 0, np.nan)
-    out["Close"] = close
-
-    # base returns
-    out["log_ret"] = np.log(close).diff()
-    out["ret"] = close.pct_change()
-
-    # rolling stats
-    out["roll_mean_7"] = close.rolling(7).mean()
-    out["roll_std_7"] = close.rolling(7).std()
-    out["roll_mean_21"] = close.rolling(21).mean()
-    out["roll_std_21"] = close.rolling(21).std()
-
-    # RSI(14)
-    delta = close.diff()
-    up = delta.clip(lower=0)
-    down = -delta.clip(upper=0)
-    roll_up = up.ewm(alpha=1 / 14, min_periods=14, adjust=False).mean()
-    roll_dn = down.ewm(alpha=1 / 14, min_periods=14, adjust=False).mean()
-    rs = roll_up / roll_dn.replace(0, np.nan)
-    out["rsi_14"] = 100 - (100 / (1 + rs))
-
-    # MACD (12,26,9)
-    ema12 = close.ewm(span=12, adjust=False).mean()
-    ema26 = close.ewm(span=26, adjust=False).mean()
-    macd = ema12 - ema26
-    out["macd"] = macd
-    out["macd_signal"] = macd.ewm(span=9, adjust=False).mean()
-    out["macd_diff"] = out["macd"] - out["macd_signal"]
-
-    # Bollinger width (20,2)
-    ma20 = close.rolling(20).mean()
-    sd20 = close.rolling(20).std()
-    out["bb_width"] = (ma20 + 2 * sd20 - (ma20 - 2 * sd20)) / close
-
-    # lags & volatility
-    out["ret_lag1"] = out["log_ret"].shift(1)
-    out["ret_lag3"] = out["log_ret"].shift(3)
-    out["ret_lag5"] = out["log_ret"].shift(5)
-    out["vol_7"] = out["log_ret"].rolling(7).std()
-    out["vol_21"] = out["log_ret"].rolling(21).std()
-    out["z_close_21"] = (close - close.rolling(21).mean()) / close.rolling(21).std()
-
-    return out.dropna()
-
-FEATURES = [
-    "Close","Volume","log_ret","ret",
-    "roll_mean_7","roll_std_7","roll_mean_21","roll_std_21",
-    "rsi_14","macd","macd_signal","macd_diff",
-    "bb_width","ret_lag1","ret_lag3","ret_lag5",
-    "vol_7","vol_21","z_close_21",
-]
-
-def make_windows(X: np.ndarray, y: np.ndarray, lookback: int, horizon: int):
-    xs, ys = [], []
-    for i in range(lookback, len(X) - horizon + 1):
-        xs.append(X[i - lookback : i, :])
-        ys.append(y[i : i + horizon])
-    return np.array(xs, dtype="float32"), np.array(ys, dtype="float32")
-
-def build_model(input_steps: int, n_features: int, horizon: int) -> tf.keras.Model:
-    inp = tf.keras.Input(shape=(input_steps, n_features))
-    x = tf.keras.layers.Conv1D(48, kernel_size=5, padding="causal", activation="relu")(inp)
-    x = tf.keras.layers.Dropout(0.2)(x)
-    x = tf.keras.layers.Bidirectional(tf.keras.layers.LSTM(160, return_sequences=True))(x)
-    x = tf.keras.layers.Dropout(0.3)(x)
-    x = tf.keras.layers.LSTM(96)(x)
-    out = tf.keras.layers.Dense(horizon)(x)
-    model = tf.keras.Model(inp, out)
-    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=1e-3), loss="mse")
-    return model
-
 # -------------------------------
 # Sliding-window LSTM backtest (legacy)
 # -------------------------------
 
-def run_backtest(ticker: str, look_back: int, horizon: int, start_date: str, end_date: str | None = None):
+MAX_WALK_FORWARD_STEPS = 50
+WARM_EPOCHS = int(os.getenv("BACKTEST_WARM_EPOCHS", "3"))
+WARM_REPLAY = int(os.getenv("BACKTEST_WARM_REPLAY", "256"))   # older windows replayed with the new ones
+BACKTEST_PROCS = int(os.getenv("BACKTEST_PROCS", str(min(8, os.cpu_count() or 1))))
+BACKTEST_TF_THREADS = int(os.getenv("BACKTEST_TF_THREADS", "1"))   # intra-op threads per worker process
+
+def _backtest_frame(ticker: str, start_date: str, end_date: str | None) -> pd.DataFrame:
     raw = fetch_prices(ticker, start=start_date, end=end_date)
-    df = add_features(raw)
+    df = feature_cache.features(raw)
     df["target_ret"] = df["log_ret"].shift(-1)
-    df = df.dropna()
-
-    X_df = df[FEATURES].astype("float32")
-    y = df["target_ret"].astype("float32").values
+    return df.dropna()
+
+def _walk_forward_starts(n_rows: int, look_back: int, horizon: int, max_steps: int = MAX_WALK_FORWARD_STEPS) -> list[int]:
+    """First evaluation row of each step; the first step is the earliest with one full training window."""
+    starts = []
+    start_idx = look_back + horizon
+    while start_idx + horizon <= n_rows and len(starts) < max_steps:
+        starts.append(start_idx)
+        start_idx += horizon
+    return starts
+
+# ----- progress reporting -----
+
+def _report(progress_cb, step: int, steps: int, epoch: int | None = None, epochs: int | None = None):
+    """Pass walk-forward progress to ``progress_cb(pct, info)``; without ``epoch`` step ``step`` (0-based) is finished."""
+    if progress_cb is None:
+        return
+    frac = 1.0 if epoch is None else epoch / max(1, epochs)
+    progress_cb((step + frac) / max(1, steps) * 100,
+                {"step": step + 1, "steps": steps, "epoch": epoch, "epochs": epochs})
+
+class _EpochProgress(tf.keras.callbacks.Callback):
+    def __init__(self, progress_cb, step: int, steps: int, epochs: int):
+        super().__init__()
+        self.progress_cb, self.step, self.steps, self.epochs = progress_cb, step, steps, epochs
+
+    def on_epoch_end(self, epoch, logs=None):
+        _report(self.progress_cb, self.step, self.steps, epoch + 1, self.epochs)
+
+def _epoch_callbacks(progress_cb, step: int, steps: int, epochs: int) -> list:
+    return [_EpochProgress(progress_cb, step, steps, epochs)] if progress_cb else []
+
+def _warm_steps(X_all: np.ndarray, y_all: np.ndarray, starts: list[int], look_back: int, horizon: int,
+                progress_cb=None) -> list[dict]:
+    """
+    Walk forward with one model: the first step trains from scratch, later steps
+    continue from the previous weights for WARM_EPOCHS on the windows added since
+    the last step (plus WARM_REPLAY older ones). Scalers are updated with
+    ``partial_fit`` on the new rows only, so they match a refit on the prefix.
+    """
+    scaler_X, scaler_y = StandardScaler(), StandardScaler()
+    model, seen, steps = None, 0, []
+    for i, start_idx in enumerate(starts):
+        t0 = time.perf_counter()
+        scaler_X.partial_fit(X_all[seen:start_idx])
+        scaler_y.partial_fit(y_all[seen:start_idx].reshape(-1, 1))
+        if model is None:
+            lo, epochs = 0, COLD_EPOCHS
+            model = build_model(look_back, X_all.shape[1], horizon)
+            cbs = [tf.keras.callbacks.EarlyStopping(monitor="loss", patience=5, restore_best_weights=True)]
+        else:
+            # rows feeding the newest (start_idx - seen) + WARM_REPLAY windows of the prefix
+            n_win = start_idx - seen + WARM_REPLAY
+            lo, epochs, cbs = max(0, start_idx - (n_win + look_back + horizon - 1)), WARM_EPOCHS, []
+        X_train_w, y_train_w = make_windows(
+            scaler_X.transform(X_all[lo:start_idx]),
+            scaler_y.transform(y_all[lo:start_idx].reshape(-1, 1)).ravel(),
+            look_back, horizon,
+        )
+        cbs = cbs + _epoch_callbacks(progress_cb, i, len(starts), epochs)
+        hist = model.fit(X_train_w, y_train_w, epochs=epochs, batch_size=32, verbose=0, callbacks=cbs)
+        train_s = time.perf_counter() - t0
+        steps.append({"start": start_idx, "next_ret": predict_next(model, scaler_X, scaler_y, X_all, start_idx, look_back),
+                      "trainSeconds": train_s, "epochs": len(hist.history["loss"]), "samples": len(X_train_w)})
+        _report(progress_cb, i, len(starts))
+        seen = start_idx
+    return steps
+
+# ----- parallel cold steps -----
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+def _step_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the parent's TensorFlow runtime is not fork-safe
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, BACKTEST_PROCS),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(BACKTEST_TF_THREADS,),
+            )
+            atexit.register(shutdown_step_pool)
+        return _pool
+
+def shutdown_step_pool():
+    """Stop the worker processes, dropping steps that haven't started; a later backtest starts a new pool."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        atexit.unregister(shutdown_step_pool)
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def iter_parallel_steps(X_all: np.ndarray, y_all: np.ndarray, starts: list[int], look_back: int, horizon: int):
+    """
+    Run the cold steps on the process pool and yield them in walk-forward order
+    as they complete. Each worker only receives the prefix it trains on.
+    """
+    pool = _step_pool()
+    futures = [pool.submit(_cold_step, X_all[:s], y_all[:s], s, look_back, horizon) for s in starts]
+    try:
+        for fut in futures:
+            yield fut.result()
+    finally:
+        for fut in futures:
+            fut.cancel()
+
+def _backtest_output(ticker: str, df: pd.DataFrame, look_back: int, horizon: int, steps: list[dict], mode: str, wall_s: float) -> dict:
     dates = df.index
-
+    close = df["Close"].to_numpy("float64")
     results: list[dict] = []
     preds: list[float] = []
     actuals: list[float] = []
     strategy_returns: list[float] = []
-
-    max_windows = 50
-    start_idx = look_back
-    # safer guard
-    while (start_idx + horizon) <= len(df) and (len(results) // max(1, horizon)) < max_windows:
-        train_X_df = X_df.iloc[:start_idx]
-        train_y = y[:start_idx]
-
-        scaler_X = StandardScaler()
-        X_train = scaler_X.fit_transform(train_X_df.values)
-        scaler_y = StandardScaler()
-        y_train_s = scaler_y.fit_transform(train_y.reshape(-1, 1)).ravel()
-
-        X_train_w, y_train_w = make_windows(X_train, y_train_s, look_back, horizon)
-        if len(X_train_w) == 0:
-            break
-        model = build_model(look_back, X_train_w.shape[2], horizon)
-        cbs = [tf.keras.callbacks.EarlyStopping(monitor="loss", patience=5, restore_best_weights=True)]
-        model.fit(X_train_w, y_train_w, epochs=20, batch_size=32, verbose=0, callbacks=cbs)
-
-        last_block_raw = train_X_df.values[-look_back:]
-        last_block = scaler_X.transform(last_block_raw).reshape(1, look_back, X_train_w.shape[2])
-        next_ret_s = model.predict(last_block, verbose=0)[0]
-        next_ret = scaler_y.inverse_transform(next_ret_s.reshape(-1, 1)).ravel()
-
-        last_price = df["Close"].iloc[start_idx - 1]
-        pred_prices = last_price * np.exp(np.cumsum(next_ret))
-        actual_prices = df["Close"].iloc[start_idx : start_idx + horizon].values
+    for step in steps:
+        start_idx = step["start"]
+        last_price = close[start_idx - 1]
+        pred_prices = last_price * np.exp(np.cumsum(step["next_ret"]))
+        actual_prices = close[start_idx : start_idx + horizon]
 
         prev_price = last_price
         for j in range(min(horizon, len(actual_prices))):
@@ -154,7 +182,6 @@ def run_backtest(ticker: str, look_back: int, horizon: int, start_date: str, end
                 actual_return = (actual_price - prev_price) / prev_price
                 pred_return = (pred_price - prev_price) / prev_price
                 strategy_returns.append(np.sign(pred_return) * actual_return)
-        start_idx += horizon
 
     if not results:
         raise ValueError("Not enough data for backtest")
@@ -182,8 +209,86 @@ def run_backtest(ticker: str, look_back: int, horizon: int, start_date: str, end
             "cumulative_return": cumulative_return,
         },
         "results": results,
+        "steps": [
+            {"date": dates[st["start"]].strftime("%Y-%m-%d"), "trainSeconds": round(st["trainSeconds"], 3),
+             "epochs": int(st["epochs"]), "samples": int(st["samples"])}
+            for st in steps
+        ],
+        "timing": {
+            "mode": mode,
+            "trainSeconds": round(sum(st["trainSeconds"] for st in steps), 3),
+            "totalSeconds": round(wall_s, 3),
+        },
     }
 
+# ----- pretrained global model (no training) -----
+
+def _global_steps(ticker: str, X_all: np.ndarray, starts: list[int], horizon: int) -> list[dict]:
+    """
+    ``horizon``-step forecasts for every start from the pretrained global model,
+    in one batched predict call, with the ticker's calibrator applied as in
+    ``run_forecast``. The window length is the model's own input length.
+    """
+    art = registry.get()
+    look_back = art.multi.input_steps
+    if horizon > art.multi.output_steps:
+        raise ValueError(f"mode=global predicts at most {art.multi.output_steps} steps ahead")
+    sid = registry.symbol_id(ticker)
+    blocks = windows_ending_at(X_all, np.asarray(starts), look_back)
+    N, L, F = blocks.shape
+    ts = art.scaler_X.transform(blocks.reshape(N * L, F)).reshape(N, L, F)
+    rets = art.multi(ts, np.full((N,), sid, dtype="int32"))[:, :horizon].astype("float64")
+    cal = registry.calibrator(sid)
+    if cal is not None:
+        rets = cal[0] * rets + cal[1]
+    return [{"start": s, "next_ret": r, "trainSeconds": 0.0, "epochs": 0, "samples": 0} for s, r in zip(starts, rets)]
+
+def _global_look_back() -> int:
+    return registry.get().multi.input_steps
+
+def run_backtest(ticker: str, look_back: int, horizon: int, start_date: str, end_date: str | None = None,
+                 warm_start: bool = False, parallel: bool = False, mode: str = "ticker", progress_cb=None):
+    """
+    Walk-forward LSTM backtest: up to MAX_WALK_FORWARD_STEPS steps, each predicting
+    the next ``horizon`` closes from the rows before it. ``warm_start`` reuses one
+    model across steps instead of training a new one per step; ``parallel`` trains
+    the (independent) cold steps on BACKTEST_PROCS worker processes.
+
+    ``mode="global"`` trains nothing: every evaluation window of the range is
+    scored by the pretrained global model (whose window replaces ``look_back``).
+    The global model may have been trained on these same bars, so its errors
+    are not strictly out-of-sample.
+
+    ``progress_cb(pct, info)`` is called after every epoch (serial modes) or
+    finished step, with ``info`` holding the step and epoch counters.
+    """
+    if mode == "global":
+        t0 = time.perf_counter()
+        df = _backtest_frame(ticker, start_date, end_date)
+        look_back = _global_look_back()
+        starts = _walk_forward_starts(len(df), look_back, horizon, max_steps=len(df))
+        steps = _global_steps(ticker, df[FEATURES].to_numpy("float32"), starts, horizon) if starts else []
+        return _backtest_output(ticker, df, look_back, horizon, steps, "global", time.perf_counter() - t0)
+    if warm_start and parallel:
+        raise ValueError("warm_start and parallel cannot be combined: warm steps depend on each other")
+    t0 = time.perf_counter()
+    df = _backtest_frame(ticker, start_date, end_date)
+    X_all = df[FEATURES].to_numpy("float32")
+    y_all = df["target_ret"].to_numpy("float32")
+    starts = _walk_forward_starts(len(df), look_back, horizon)
+    if warm_start:
+        mode, steps = "warm", _warm_steps(X_all, y_all, starts, look_back, horizon, progress_cb)
+    else:
+        mode, steps = ("parallel" if parallel else "cold"), []
+        # worker processes can't call back into this one, so parallel steps report as they finish
+        it = (iter_parallel_steps(X_all, y_all, starts, look_back, horizon) if parallel else
+              (_cold_step(X_all, y_all, s, look_back, horizon, _epoch_callbacks(progress_cb, i, len(starts), COLD_EPOCHS))
+               for i, s in enumerate(starts)))
+        for i, step in enumerate(it):
+            steps.append(step)
+            _report(progress_cb, i, len(starts))
+    return _backtest_output(ticker, df, look_back, horizon, steps, mode, time.perf_counter() - t0)
+
 # -------------------------------
 # Strategy backtester (job flow)
 # -------------------------------
@@ -198,7 +303,7 @@ def simulate_backtest(payload, progress_cb=None):
     slippage = float(payload.costs.slippage_bps) / 10000.0
     commission = float(payload.costs.commission_per_trade)
 
-    df = yf.download(ticker, period=period, interval=interval, auto_adjust=True, progress=False)
+    df = price_store.get(ticker, interval=interval, period=period)
     if df.empty:
         raise ValueError("No data returned")
     prices = df["Close"].dropna()
@@ -326,14 +431,24 @@ def simulate_backtest(payload, progress_cb=None):
 # Simple 90→10 “accuracy” backtest
 # -------------------------------
 
-def run_backtest_last(ticker: str, look_back: int = 90, horizon: int = 10):
+def run_backtest_last(ticker: str, look_back: int = 90, horizon: int = 10, mode: str = "ticker", progress_cb=None):
+    if mode == "global":
+        look_back = _global_look_back()
     # 1) Overfetch plenty of calendar days; yfinance will drop non-trading days for equities
     start_date = (datetime.utcnow() - timedelta(days=look_back + horizon + 320)).strftime("%Y-%m-%d")
     raw = fetch_prices(ticker, start=start_date, end=None)
-    df = add_features(raw)
+    df = feature_cache.features(raw)
     df["target_ret"] = df["log_ret"].shift(-1)
     df = df.dropna()
 
+    if mode == "global":
+        # one window ending where the evaluation block starts, scored without training
+        t0 = time.perf_counter()
+        if len(df) < look_back + horizon:
+            raise ValueError(f"Not enough data: need ≥{look_back + horizon} rows, got {len(df)}")
+        steps = _global_steps(ticker, df[FEATURES].to_numpy("float32"), [len(df) - horizon], horizon)
+        return _backtest_output(ticker, df, look_back, horizon, steps, "global", time.perf_counter() - t0)
+
     # 2) Must have at least look_back + 2 rows (one to predict from, at least one to evaluate)
     min_needed = max(look_back + 2, horizon + 2)
     if len(df) < min_needed:
@@ -357,26 +472,37 @@ def run_backtest_last(ticker: str, look_back: int = 90, horizon: int = 10):
         look_back = int(max(2, start_idx))
     train_X_df = X_df.iloc[:start_idx]
     train_y = y[:start_idx]
+    n_features = train_X_df.shape[1]
 
-    scaler_X = StandardScaler().fit(train_X_df.values)
-    scaler_y = StandardScaler().fit(train_y.reshape(-1, 1))
-
-    X_train = scaler_X.transform(train_X_df.values)
-    y_train_s = scaler_y.transform(train_y.reshape(-1, 1)).ravel()
+    # the fit only depends on the training block, which changes when a new bar arrives
+    cache_key = make_model_key(ticker, look_back, horizon, pd.Timestamp(dates[start_idx - 1]).isoformat())
+    fitted = model_cache.get(cache_key)
+    if fitted is None:
+        scaler_X = StandardScaler().fit(train_X_df.values)
+        scaler_y = StandardScaler().fit(train_y.reshape(-1, 1))
 
-    X_train_w, y_train_w = make_windows(X_train, y_train_s, look_back, horizon)
-    if len(X_train_w) == 0:
-        raise ValueError("Not enough windows for training after safety caps")
+        X_train = scaler_X.transform(train_X_df.values)
+        y_train_s = scaler_y.transform(train_y.reshape(-1, 1)).ravel()
 
-    model = build_model(look_back, X_train_w.shape[2], horizon)
-    cbs = [tf.keras.callbacks.EarlyStopping(monitor="loss", patience=6, restore_best_weights=True)]
-    model.fit(X_train_w, y_train_w, epochs=24, batch_size=32, verbose=0, callbacks=cbs)
+        X_train_w, y_train_w = make_windows(X_train, y_train_s, look_back, horizon)
+        if len(X_train_w) == 0:
+            raise ValueError("Not enough windows for training after safety caps")
+
+        model = build_model(look_back, n_features, horizon)
+        cbs = [tf.keras.callbacks.EarlyStopping(monitor="loss", patience=6, restore_best_weights=True),
+               *_epoch_callbacks(progress_cb, 0, 1, 24)]
+        model.fit(X_train_w, y_train_w, epochs=24, batch_size=32, verbose=0, callbacks=cbs)
+        fitted = FittedModel.capture(model, scaler_X, scaler_y)
+        model_cache.set(cache_key, fitted)
+    else:
+        model = build_model(look_back, n_features, horizon)
+        model.set_weights(fitted.weights)
 
     # 5) Predict from the last look_back training rows
     last_block_raw = train_X_df.values[-look_back:]
-    last_block = scaler_X.transform(last_block_raw).reshape(1, look_back, X_train_w.shape[2])
+    last_block = fitted.transform_X(last_block_raw).reshape(1, look_back, n_features)
     next_ret_s = model.predict(last_block, verbose=0)[0]                # shape (horizon,)
-    next_ret = scaler_y.inverse_transform(next_ret_s.reshape(-1, 1)).ravel()
+    next_ret = fitted.inverse_y(next_ret_s.astype("float64"))
 
     last_price = float(df["Close"].iloc[start_idx - 1])
     # 6) Ensure pred length == actual length by explicit capping
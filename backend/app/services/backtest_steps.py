@@ -0,0 +1,68 @@
+# app/services/backtest_steps.py
+"""Model and single walk-forward step of the LSTM backtest.
+
+This is what the ``parallel=true`` worker processes run. Pool workers are
+spawned and import whatever the pickled function's module imports, so this
+module stays small: TensorFlow, scikit-learn and the window helper. It does
+not pull in the price store, the global model or the registry, and their
+atexit hooks (symbol index flush, calibrator tables).
+"""
+from __future__ import annotations
+
+import time
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+import tensorflow as tf
+
+from app.services.windows import make_windows
+
+COLD_EPOCHS = 20
+
+
+def build_model(input_steps: int, n_features: int, horizon: int) -> tf.keras.Model:
+    inp = tf.keras.Input(shape=(input_steps, n_features))
+    x = tf.keras.layers.Conv1D(48, kernel_size=5, padding="causal", activation="relu")(inp)
+    x = tf.keras.layers.Dropout(0.2)(x)
+    x = tf.keras.layers.Bidirectional(tf.keras.layers.LSTM(160, return_sequences=True))(x)
+    x = tf.keras.layers.Dropout(0.3)(x)
+    x = tf.keras.layers.LSTM(96)(x)
+    out = tf.keras.layers.Dense(horizon)(x)
+    model = tf.keras.Model(inp, out)
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=1e-3), loss="mse")
+    return model
+
+
+def predict_next(model, scaler_X, scaler_y, X_all: np.ndarray, start_idx: int, look_back: int) -> np.ndarray:
+    block = scaler_X.transform(X_all[start_idx - look_back:start_idx]).reshape(1, look_back, X_all.shape[1])
+    next_ret_s = model.predict(block, verbose=0)[0]
+    return scaler_y.inverse_transform(next_ret_s.reshape(-1, 1)).ravel()
+
+
+def cold_step(X_all: np.ndarray, y_all: np.ndarray, start_idx: int, look_back: int, horizon: int,
+              callbacks: list | None = None) -> dict:
+    """One independent walk-forward step: fresh scalers and a fresh model trained on the whole prefix."""
+    t0 = time.perf_counter()
+    scaler_X = StandardScaler().fit(X_all[:start_idx])
+    scaler_y = StandardScaler().fit(y_all[:start_idx].reshape(-1, 1))
+    X_train_w, y_train_w = make_windows(
+        scaler_X.transform(X_all[:start_idx]),
+        scaler_y.transform(y_all[:start_idx].reshape(-1, 1)).ravel(),
+        look_back, horizon,
+    )
+    model = build_model(look_back, X_all.shape[1], horizon)
+    cbs = [tf.keras.callbacks.EarlyStopping(monitor="loss", patience=5, restore_best_weights=True), *(callbacks or [])]
+    hist = model.fit(X_train_w, y_train_w, epochs=COLD_EPOCHS, batch_size=32, verbose=0, callbacks=cbs)
+    train_s = time.perf_counter() - t0
+    return {"start": start_idx, "next_ret": predict_next(model, scaler_X, scaler_y, X_all, start_idx, look_back),
+            "trainSeconds": train_s, "epochs": len(hist.history["loss"]), "samples": len(X_train_w)}
+
+
+def init_worker(tf_threads: int):
+    """
+    Pool initializer: one process per core, each kept to ``tf_threads`` intra-op
+    threads so they don't oversubscribe the CPU. It runs before the worker's
+    first op, which is when TensorFlow reads these settings.
+    """
+    tf.config.threading.set_intra_op_parallelism_threads(tf_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
@@ -0,0 +1,119 @@
+# app/services/calibrators.py
+"""Per-symbol linear calibrators stored as one array indexed by symbol id.
+
+Row ``sid`` of ``calibrators.npy`` holds ``(a, b)`` for ``a * pred + b``;
+NaN rows mean "not fitted". The file is memory-mapped, so a batch forecast
+applies its calibrators with one gather. Updates are written row by row
+with ``pwrite`` and synced, so only the pages holding those rows go to disk;
+other processes mapping the same file see them through the page cache. The
+file is created under the symbol index's file lock, so concurrent first uses
+agree on one inode. An existing ``calibrators.json`` is migrated on first use.
+"""
+from __future__ import annotations
+
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+
+from app.core.config import logger
+from app.services.symbol_index import SymbolIndex
+
+
+_sync = getattr(os, "fdatasync", os.fsync)
+
+
+class CalibratorTable:
+    def __init__(self, path: Path, capacity: int, index: SymbolIndex, legacy_json: Path | None = None):
+        self.path = Path(path)
+        self.capacity = capacity
+        self.index = index
+        self.legacy_json = legacy_json
+        self._lock = threading.Lock()
+        self._arr: np.memmap | None = None
+        self._fd: int | None = None
+        index.on_release(self.reset)   # a reused id must not inherit the previous symbol's calibrator
+
+    # ----- storage -----
+
+    def _create(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        arr = np.lib.format.open_memmap(tmp, mode="w+", dtype="float64", shape=(self.capacity, 2))
+        arr[:] = np.nan
+        migrated = self._migrate(arr)
+        arr.flush()
+        del arr
+        os.replace(tmp, self.path)
+        if migrated:
+            logger.info("Migrated %d calibrators from %s", migrated, self.legacy_json)
+
+    def _migrate(self, arr: np.ndarray) -> int:
+        if not self.legacy_json or not self.legacy_json.exists():
+            return 0
+        try:
+            legacy: Dict[str, dict] = json.loads(self.legacy_json.read_text())
+        except Exception as e:
+            logger.warning("Skipping unreadable %s: %s", self.legacy_json, e)
+            return 0
+        sids = self.index.ensure_many(legacy)
+        for sym, ab in legacy.items():
+            arr[sids[sym.upper().strip()]] = (float(ab["a"]), float(ab["b"]))
+        return len(legacy)
+
+    def _table(self) -> np.memmap:
+        if self._arr is None:
+            with self._lock:
+                if self._arr is None:
+                    if not self.path.exists():
+                        with self.index.locked():
+                            if not self.path.exists():   # another process may have won the race
+                                self._create()
+                    arr = np.load(self.path, mmap_mode="r")
+                    if arr.shape != (self.capacity, 2):
+                        raise RuntimeError(f"{self.path} has shape {arr.shape}, expected {(self.capacity, 2)}")
+                    self._fd = os.open(self.path, os.O_RDWR)
+                    self._arr = arr
+        return self._arr
+
+    # ----- reads -----
+
+    def get(self, sid: int) -> Tuple[float, float] | None:
+        a, b = self._table()[sid]
+        return None if np.isnan(a) else (float(a), float(b))
+
+    def gather(self, sids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Slopes and intercepts for ``sids``; unfitted rows come back as identity (1, 0)."""
+        rows = np.asarray(self._table()[np.asarray(sids, dtype="int64")])
+        unset = np.isnan(rows[:, 0])
+        rows[unset] = (1.0, 0.0)
+        return rows[:, 0], rows[:, 1]
+
+    # ----- writes -----
+
+    def set(self, sid: int, a: float, b: float):
+        self.set_many(np.array([sid]), np.array([[a, b]]))
+
+    def set_many(self, sids: np.ndarray, ab: np.ndarray):
+        arr = self._table()
+        sids = np.asarray(sids, dtype="int64")
+        if sids.size and not (0 <= sids.min() and sids.max() < self.capacity):
+            raise IndexError(f"symbol id out of range for {self.capacity} calibrators")
+        rows = np.asarray(ab, dtype=arr.dtype).reshape(-1, 2)
+        width = rows.itemsize * 2
+        with self._lock:
+            for sid, row in zip(sids.tolist(), rows):
+                os.pwrite(self._fd, row.tobytes(), arr.offset + sid * width)
+            _sync(self._fd)
+
+    def reset(self, sid: int):
+        """Back to "not fitted" (identity)."""
+        if self._arr is None and not self.path.exists():
+            return
+        self.set_many(np.array([sid]), np.full((1, 2), np.nan))
+
+    def fitted(self) -> int:
+        return int((~np.isnan(self._table()[:, 0])).sum())
@@ -0,0 +1,111 @@
+# app/services/executor.py
+"""Bounded worker pools for CPU-heavy forecast and backtest work.
+
+A fixed number of worker threads run jobs; at most ``max_queue`` more may
+wait. Submitting past that raises :class:`QueueFull` so routes can answer
+429 instead of piling work onto the event loop's default thread pool.
+"""
+from __future__ import annotations
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", "2"))
+FORECAST_QUEUE_MAX = int(os.getenv("FORECAST_QUEUE_MAX", "32"))
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", "2"))
+BACKTEST_QUEUE_MAX = int(os.getenv("BACKTEST_QUEUE_MAX", "8"))
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Queue is full")
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    def __init__(self, workers: int, max_queue: int, name: str = "worker", initial_eta: float = 5.0):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued: OrderedDict[int, Future] = OrderedDict()
+        self._running = 0
+        self._avg_s = initial_eta   # EWMA of job run time, seeds the ETA estimate
+        self.completed = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    # ----- submission -----
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        with self._lock:
+            if len(self._queued) >= self.max_queue + max(0, self.workers - self._running):
+                self.rejected += 1
+                raise QueueFull(self._eta(len(self._queued)))
+            holder: dict = {}
+            fut = self._pool.submit(self._run, holder, fn, args, kwargs)
+            holder["fut"] = fut
+            self._queued[id(fut)] = fut
+        fut.add_done_callback(self._on_done)
+        return fut
+
+    def _run(self, holder: dict, fn, args, kwargs):
+        with self._lock:
+            self._queued.pop(id(holder.get("fut")), None)
+            self._running += 1
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            dt = time.perf_counter() - t0
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+                self._avg_s = 0.8 * self._avg_s + 0.2 * dt
+
+    def _on_done(self, fut: Future):
+        if fut.cancelled():
+            with self._lock:
+                self._queued.pop(id(fut), None)
+                self.cancelled += 1
+
+    def cancel(self, fut: Future) -> bool:
+        """Cancel a job that has not started yet."""
+        return fut.cancel()
+
+    # ----- introspection -----
+
+    def _eta(self, position: int) -> int:
+        # jobs ahead drain ``workers`` at a time, plus our own run
+        return int(round((position // self.workers + 1) * self._avg_s))
+
+    def position(self, fut: Future) -> dict:
+        with self._lock:
+            if fut.done():
+                return {"state": "done"}
+            if id(fut) not in self._queued:
+                return {"state": "running", "etaSeconds": int(round(self._avg_s))}
+            pos = list(self._queued).index(id(fut))
+            return {"state": "queued", "queuePosition": pos + 1, "etaSeconds": self._eta(pos)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": len(self._queued),
+                "maxQueue": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "cancelled": self.cancelled,
+                "avgSeconds": round(self._avg_s, 3),
+            }
+
+
+forecast_executor = BoundedExecutor(FORECAST_WORKERS, FORECAST_QUEUE_MAX, name="forecast")
+# LSTM backtests train for tens of seconds, so seed the ETA accordingly
+backtest_executor = BoundedExecutor(BACKTEST_WORKERS, BACKTEST_QUEUE_MAX, name="backtest", initial_eta=60.0)
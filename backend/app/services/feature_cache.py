@@ -0,0 +1,224 @@
+# app/services/feature_cache.py
+"""Content-addressed cache of feature frames.
+
+An entry's key is a digest of what the frame was computed from: the bytes of
+the input bars (index plus OHLCV values), the feature set and its version,
+and any extra parameters. Equal inputs always map to the same entry. Any
+change in the prices (a new bar, a revised bar, a different start date)
+produces a new key, so an entry never needs to be invalidated.
+
+Entries live in a small in-memory LRU and as uncompressed ``.npz`` files
+(timestamps, one float64 block, column names) under ``FEATURE_CACHE_DIR``.
+Loading one takes about a quarter of the time needed to recompute the
+features, whereas reading parquet took longer than recomputing. The
+directory is kept under ``FEATURE_CACHE_MAX_MB`` by evicting the least
+recently used files. A hit refreshes a file's mtime, so the LRU order
+survives restarts and is shared between processes.
+"""
+from __future__ import annotations
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import logger
+from app.services.features import add_features, make_features, FEATURE_SET_VERSION
+
+FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", "data/features")   # empty => memory only
+FEATURE_CACHE_MAX_MB = float(os.getenv("FEATURE_CACHE_MAX_MB", "512"))
+FEATURE_CACHE_MEM = int(os.getenv("FEATURE_CACHE_MEM", "64"))           # frames kept in RAM
+
+FEATURE_SETS: Dict[str, Callable[[pd.DataFrame], pd.DataFrame]] = {
+    "backtest": add_features,
+    "global": make_features,
+}
+
+
+def _dump(path: Path, df: pd.DataFrame):
+    idx = df.index
+    with open(path, "wb") as f:
+        np.savez(f, index=idx.as_unit("ns").asi8, values=df.to_numpy(dtype="float64"),
+                 columns=np.array([str(c) for c in df.columns], dtype="U"),
+                 meta=np.array([str(idx.tz or ""), str(idx.name or ""), idx.unit], dtype="U"))
+
+
+def _load(path: Path) -> pd.DataFrame:
+    with np.load(path) as z:
+        tz, name, unit = (str(x) for x in z["meta"])
+        idx = pd.DatetimeIndex(z["index"].astype("datetime64[ns]"), name=name or None).as_unit(unit)
+        if tz:
+            idx = idx.tz_localize("UTC").tz_convert(tz)
+        return pd.DataFrame(z["values"], index=idx, columns=[str(c) for c in z["columns"]])
+
+
+def price_digest(bars: pd.DataFrame) -> str:
+    """Digest of the bars' timestamps, column names and values."""
+    h = hashlib.sha1()
+    idx = bars.index
+    if isinstance(idx, pd.DatetimeIndex):
+        h.update(str(idx.tz).encode())
+        h.update(np.ascontiguousarray(idx.as_unit("ns").asi8).tobytes())
+    else:
+        h.update(pd.util.hash_pandas_object(idx, index=False).to_numpy().tobytes())
+    h.update(json.dumps([str(c) for c in bars.columns]).encode())
+    h.update(np.ascontiguousarray(bars.to_numpy(dtype="float64")).tobytes())
+    return h.hexdigest()
+
+
+class FeatureCache:
+    def __init__(self, disk_dir: str | None = FEATURE_CACHE_DIR, max_mb: float = FEATURE_CACHE_MAX_MB,
+                 mem_entries: int = FEATURE_CACHE_MEM):
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.mem_entries = mem_entries
+        self._mem: OrderedDict[str, pd.DataFrame] = OrderedDict()
+        self._lock = threading.Lock()
+        self._files: Dict[str, Tuple[int, float]] | None = None   # digest -> (bytes, last use), loaded lazily
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, bars: pd.DataFrame, kind: str, params: dict | None = None) -> str:
+        parts = {"prices": price_digest(bars), "set": kind, "version": FEATURE_SET_VERSION, "params": params or {}}
+        return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.npz"
+
+    # ----- disk index -----
+
+    def _index(self) -> Dict[str, Tuple[int, float]]:
+        """Sizes and mtimes of the files on disk (scanned once, then kept up to date)."""
+        if self._files is None:
+            self._files, self._bytes = {}, 0
+            if self.disk_dir and self.disk_dir.exists():
+                for p in self.disk_dir.glob("*/*.npz"):
+                    try:
+                        st = p.stat()
+                    except FileNotFoundError:
+                        continue
+                    self._files[p.stem] = (st.st_size, st.st_mtime)
+                    self._bytes += st.st_size
+        return self._files
+
+    def _evict(self):
+        files = self._index()
+        if self._bytes <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(files.items(), key=lambda kv: kv[1][1]):
+            if self._bytes <= self.max_bytes:
+                break
+            self._path(key).unlink(missing_ok=True)
+            del files[key]
+            self._bytes -= size
+            self.evictions += 1
+
+    # ----- memory tier -----
+
+    def _put_mem(self, key: str, df: pd.DataFrame):
+        self._mem[key] = df
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.mem_entries:
+            self._mem.popitem(last=False)
+
+    # ----- public API -----
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return self._mem[key].copy()
+        if self.disk_dir:
+            p = self._path(key)
+            try:
+                df = _load(p)
+                os.utime(p)   # mark as recently used for LRU eviction
+            except FileNotFoundError:
+                df = None
+            except Exception as e:
+                logger.warning("Dropping unreadable feature cache entry %s: %s", p.name, e)
+                p.unlink(missing_ok=True)
+                df = None
+            if df is not None:
+                with self._lock:
+                    files = self._index()
+                    if key in files:
+                        files[key] = (files[key][0], os.path.getmtime(p))
+                    self._put_mem(key, df)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return df.copy()
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, df: pd.DataFrame):
+        with self._lock:
+            self._put_mem(key, df)
+        if not self.disk_dir or not isinstance(df.index, pd.DatetimeIndex):
+            return
+        p = self._path(key)
+        tmp = p.with_name(f"{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            _dump(tmp, df)
+            os.replace(tmp, p)
+            st = p.stat()
+        except Exception as e:
+            logger.warning("Could not persist feature cache entry: %s", e)
+            tmp.unlink(missing_ok=True)
+            return
+        with self._lock:
+            files = self._index()
+            old = files.get(key)
+            files[key] = (st.st_size, st.st_mtime)
+            self._bytes += st.st_size - (old[0] if old else 0)
+            self._evict()
+
+    def features(self, bars: pd.DataFrame, kind: str = "backtest", params: dict | None = None) -> pd.DataFrame:
+        """Feature frame ``kind`` of ``bars``, computed at most once per distinct input."""
+        key = self.key(bars, kind, params)
+        hit = self.get(key)
+        if hit is not None:
+            return hit
+        df = FEATURE_SETS[kind](bars)
+        self.set(key, df)
+        return df.copy()
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self.disk_dir:
+                for p in self.disk_dir.glob("*/*.npz"):
+                    p.unlink(missing_ok=True)
+            self._files, self._bytes = {}, 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            self._index()
+            return {
+                "memEntries": len(self._mem),
+                "diskEntries": len(self._files or {}),
+                "diskMB": round(self._bytes / 1024 / 1024, 2),
+                "maxMB": round(self.max_bytes / 1024 / 1024, 2),
+                "hits": self.hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "disk": str(self.disk_dir) if self.disk_dir else None,
+            }
+
+
+feature_cache = FeatureCache()
@@ -0,0 +1,306 @@
+# app/services/features.py
+"""Technical features for many symbols at once.
+
+This is the single home of the indicator math that used to be copied into
+``services/backtest.add_features``, ``manage_global_lstm.make_features`` and
+the notebook. Prices are stacked into a ``(time, symbol)`` float64 panel and
+every indicator is a column-wise NumPy kernel, so a whole universe costs a
+handful of array passes instead of one pandas pipeline per symbol.
+
+Symbols are right-aligned in the panel: row ``T-1`` is every symbol's newest
+bar, and shorter histories are padded with leading NaN. The kernels treat
+NaN like pandas does (a rolling window with a NaN in it is NaN, and EWMs
+skip NaN with ``ignore_na=False`` decay), so each symbol's column matches
+running the pandas version on that symbol alone. The one difference: a
+window of identical values has a std of exactly 0, where pandas can return
+rounding noise.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, List, Mapping, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+NAN = np.nan
+
+FEATURE_CHUNK = 256   # symbols per panel; bounds memory on large universes
+FEATURE_SET_VERSION = 1   # bump whenever a feature definition changes; invalidates cached features
+
+# Inputs of the backtest / forecast LSTM (see services/backtest.py)
+FEATURES = [
+    "Close","Volume","log_ret","ret",
+    "roll_mean_7","roll_std_7","roll_mean_21","roll_std_21",
+    "rsi_14","macd","macd_signal","macd_diff",
+    "bb_width","ret_lag1","ret_lag3","ret_lag5",
+    "vol_7","vol_21","z_close_21",
+]
+
+# Inputs of the global LSTM CLI (see manage_global_lstm.py)
+FEATS = ["ret1", "ret5", "rsi14", "macd", "macd_sig", "bbp", "vol_z"]
+TARGET = "target_ret"
+
+
+# ---------------------------
+# Kernels on (T, N) arrays
+# ---------------------------
+
+def _2d(a) -> np.ndarray:
+    a = np.asarray(a, dtype="float64")
+    return a[:, None] if a.ndim == 1 else a
+
+
+def shift(a: np.ndarray, k: int = 1) -> np.ndarray:
+    out = np.full_like(a, NAN)
+    if k < len(a):
+        out[k:] = a[:len(a) - k]
+    return out
+
+
+def diff(a: np.ndarray, k: int = 1) -> np.ndarray:
+    return a - shift(a, k)
+
+
+def pct_change(a: np.ndarray, k: int = 1) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return a / shift(a, k) - 1.0
+
+
+def rolling_sum(a: np.ndarray, n: int) -> np.ndarray:
+    """Sum of the last ``n`` rows; NaN while the window is short or holds a NaN."""
+    T = len(a)
+    out = np.full_like(a, NAN)
+    if T >= n:
+        s = a[n - 1:].copy()
+        for k in range(1, n):
+            s += a[n - 1 - k:T - k]
+        out[n - 1:] = s
+    return out
+
+
+def _constant(a: np.ndarray, n: int) -> np.ndarray:
+    """True where the last ``n`` rows are all the same (non-NaN) value."""
+    if len(a) == 0:
+        return np.zeros(a.shape, dtype=bool)
+    t = np.arange(len(a)).reshape((-1,) + (1,) * (a.ndim - 1))
+    brk = np.ones(a.shape, dtype=bool)
+    brk[1:] = a[1:] != a[:-1]                     # NaN != NaN, so NaN always starts a new run
+    start = np.maximum.accumulate(np.where(brk, t, 0), axis=0)
+    return (t - start + 1 >= n) & ~np.isnan(a)
+
+
+def rolling_mean(a: np.ndarray, n: int) -> np.ndarray:
+    out = rolling_sum(a, n) / n
+    const = _constant(a, n)
+    out[const] = a[const]
+    return out
+
+
+def rolling_std(a: np.ndarray, n: int, ddof: int = 1) -> np.ndarray:
+    """Two-pass windowed std (exact 0 on constant windows)."""
+    T = len(a)
+    mu = rolling_sum(a, n) / n
+    out = np.full_like(a, NAN)
+    if T >= n and n > ddof:
+        m = mu[n - 1:]
+        ss = np.zeros_like(m)
+        for k in range(n):
+            d = a[n - 1 - k:T - k] - m
+            ss += d * d
+        out[n - 1:] = np.sqrt(ss / (n - ddof))
+        out[_constant(a, n)] = 0.0
+    return out
+
+
+def _ewm_loop(a: np.ndarray, alpha: float) -> np.ndarray:
+    """pandas ``adjust=False, ignore_na=False`` recursion, one row at a time (handles interior NaN)."""
+    out = np.empty_like(a)
+    w = np.full(a.shape[1], NAN)
+    old = np.ones(a.shape[1])
+    with np.errstate(invalid="ignore"):
+        for t in range(len(a)):
+            x = a[t]
+            obs = ~np.isnan(x)
+            has = ~np.isnan(w)
+            old = np.where(has, old * (1.0 - alpha), old)
+            upd = has & obs & (w != x)
+            w = np.where(upd, (old * w + alpha * x) / (old + alpha), w)
+            old = np.where(has & obs, 1.0, old)
+            w = np.where(~has & obs, x, w)
+            out[t] = w
+    return out
+
+
+def ewm_mean(a: np.ndarray, alpha: float, min_periods: int = 0) -> np.ndarray:
+    """``DataFrame.ewm(alpha=alpha, adjust=False, min_periods=...).mean()`` per column."""
+    a = _2d(a)
+    T = len(a)
+    valid = ~np.isnan(a)
+    nobs = np.cumsum(valid, axis=0)
+    first = np.where(valid.any(axis=0), valid.argmax(axis=0), T)
+    leading = np.arange(T)[:, None] < first
+    if np.array_equal(valid, ~leading):
+        # only leading NaN: a first-order IIR filter seeded with each column's first value
+        x0 = a[np.minimum(first, T - 1), np.arange(a.shape[1])]
+        filled = np.where(leading, x0, a)
+        out, _ = lfilter([alpha], [1.0, alpha - 1.0], filled, axis=0, zi=((1.0 - alpha) * x0)[None, :])
+        out[leading] = NAN
+    else:
+        out = _ewm_loop(a, alpha)
+    out[nobs < max(min_periods, 1)] = NAN
+    return out
+
+
+def span_alpha(span: int) -> float:
+    return 2.0 / (span + 1.0)
+
+
+# ---------------------------
+# Feature sets on a panel
+# ---------------------------
+
+def backtest_panel(close: np.ndarray, volume: np.ndarray) -> Dict[str, np.ndarray]:
+    """Feature arrays of ``add_features`` (before its ``dropna``)."""
+    close = np.where(close > 0, close, NAN)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_ret = diff(np.log(close))
+        delta = diff(close)
+        roll_up = ewm_mean(np.where(np.isnan(delta), NAN, np.maximum(delta, 0.0)), 1 / 14, 14)
+        roll_dn = ewm_mean(np.where(np.isnan(delta), NAN, -np.minimum(delta, 0.0)), 1 / 14, 14)
+        rs = roll_up / np.where(roll_dn == 0, NAN, roll_dn)
+        macd = ewm_mean(close, span_alpha(12)) - ewm_mean(close, span_alpha(26))
+        signal = ewm_mean(macd, span_alpha(9))
+        ma20, sd20 = rolling_mean(close, 20), rolling_std(close, 20)
+        m21, s21 = rolling_mean(close, 21), rolling_std(close, 21)
+        return {
+            "Close": close, "Volume": volume,
+            "log_ret": log_ret, "ret": pct_change(close),
+            "roll_mean_7": rolling_mean(close, 7), "roll_std_7": rolling_std(close, 7),
+            "roll_mean_21": m21, "roll_std_21": s21,
+            "rsi_14": 100 - (100 / (1 + rs)),
+            "macd": macd, "macd_signal": signal, "macd_diff": macd - signal,
+            "bb_width": (ma20 + 2 * sd20 - (ma20 - 2 * sd20)) / close,
+            "ret_lag1": shift(log_ret, 1), "ret_lag3": shift(log_ret, 3), "ret_lag5": shift(log_ret, 5),
+            "vol_7": rolling_std(log_ret, 7), "vol_21": rolling_std(log_ret, 21),
+            "z_close_21": (close - m21) / s21,
+        }
+
+
+def global_panel(close: np.ndarray, volume: np.ndarray, live: np.ndarray) -> Dict[str, np.ndarray]:
+    """Feature arrays of ``make_features``; ``live`` marks real (non-padding) rows."""
+    def fill(x, v):
+        return np.where(np.isnan(x), v, x)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d = diff(close)
+        alpha = 1 / 14   # com=13
+        ma_u = ewm_mean(np.where(np.isnan(d), NAN, np.maximum(d, 0.0)), alpha)
+        ma_d = ewm_mean(np.where(np.isnan(d), NAN, -np.minimum(d, 0.0)), alpha)
+        rsi = 100 - (100 / (1 + ma_u / (ma_d + 1e-9)))
+        m = ewm_mean(close, span_alpha(12)) - ewm_mean(close, span_alpha(26))
+        s = ewm_mean(m, span_alpha(9))
+        ma, sd = rolling_mean(close, 20), rolling_std(close, 20, ddof=0)
+        up, lo = ma + 2.0 * sd, ma - 2.0 * sd
+        bbp = (close - lo) / (up - lo + 1e-9)
+        logv = np.log1p(np.where(live & np.isnan(volume), 0.0, volume))
+        vz = (logv - rolling_mean(logv, 20)) / (rolling_std(logv, 20, ddof=0) + 1e-9)
+        vz = fill(np.where(np.isinf(vz), 0.0, vz), 0.0)
+        ret1 = fill(pct_change(close), 0.0)
+        return {
+            "ret1": ret1, "ret5": fill(pct_change(close, 5), 0.0),
+            "rsi14": fill(rsi, 50.0) / 100, "macd": fill(m, 0.0), "macd_sig": fill(s, 0.0),
+            "bbp": fill(bbp, 0.5), "vol_z": vz, TARGET: fill(_lead(ret1), 0.0),
+        }
+
+
+def _lead(a: np.ndarray) -> np.ndarray:
+    out = np.full_like(a, NAN)
+    out[:-1] = a[1:]
+    return out
+
+
+# ---------------------------
+# DataFrame front ends
+# ---------------------------
+
+def _column(df: pd.DataFrame, name: str) -> np.ndarray:
+    if name not in df.columns:
+        return np.full(len(df), NAN)
+    return pd.to_numeric(df[name].squeeze(), errors="coerce").to_numpy(dtype="float64")
+
+
+def _stack(frames: List[pd.DataFrame]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Right-aligned ``(T, N)`` close / volume panels plus the mask of real rows."""
+    T = max((len(df) for df in frames), default=0)
+    close = np.full((T, len(frames)), NAN)
+    volume = np.full((T, len(frames)), NAN)
+    live = np.zeros((T, len(frames)), dtype=bool)
+    for j, df in enumerate(frames):
+        n = len(df)
+        if n:
+            close[T - n:, j] = _column(df, "Close")
+            volume[T - n:, j] = _column(df, "Volume")
+            live[T - n:, j] = True
+    return close, volume, live
+
+
+def _chunks(frames: Mapping[str, pd.DataFrame], chunk: int) -> Iterable[List[Tuple[str, pd.DataFrame]]]:
+    items = list(frames.items())
+    for i in range(0, len(items), max(1, chunk)):
+        yield items[i:i + chunk]
+
+
+def iter_features(frames: Mapping[str, pd.DataFrame], columns: List[str], kind: str = "backtest",
+                  chunk: int = FEATURE_CHUNK) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+    """
+    ``(symbol, rows, X)`` per frame without building DataFrames: ``X`` is
+    float64 ``(len(rows), len(columns))`` and ``rows`` a boolean mask over the
+    frame's rows. ``"backtest"`` keeps only rows without NaN (``add_features``),
+    ``"global"`` keeps every row (``make_features``).
+    """
+    for part in _chunks(frames, chunk):
+        close, volume, live = _stack([df for _, df in part])
+        feats = backtest_panel(close, volume) if kind == "backtest" else global_panel(close, volume, live)
+        block = np.stack([feats[c] for c in columns], axis=-1)     # (T, N, F)
+        T = len(close)
+        for j, (sym, df) in enumerate(part):
+            X = block[T - len(df):, j]
+            if kind == "backtest":
+                every = [feats[c][T - len(df):, j] for c in feats if c not in columns]
+                rows = ~np.isnan(X).any(axis=1) & df.notna().all(axis=1).to_numpy()
+                for a in every:
+                    rows &= ~np.isnan(a)
+                X = X[rows]
+            else:
+                rows = np.ones(len(df), dtype=bool)
+            yield sym, rows, X
+
+
+def add_features_many(frames: Mapping[str, pd.DataFrame], chunk: int = FEATURE_CHUNK) -> Dict[str, pd.DataFrame]:
+    """``add_features`` for every frame, computed ``chunk`` symbols per panel."""
+    cols = [c for c in FEATURES if c != "Volume"]
+    out: Dict[str, pd.DataFrame] = {}
+    for sym, rows, X in iter_features(frames, cols, "backtest", chunk):
+        df = frames[sym]
+        base = df[rows].copy()
+        base["Close"] = X[:, 0]
+        out[sym] = pd.concat([base, pd.DataFrame(X[:, 1:], index=base.index, columns=cols[1:])], axis=1)
+    return out
+
+
+def make_features_many(frames: Mapping[str, pd.DataFrame], chunk: int = FEATURE_CHUNK) -> Dict[str, pd.DataFrame]:
+    """``make_features`` for every frame, computed ``chunk`` symbols per panel."""
+    cols = FEATS + [TARGET]
+    return {sym: pd.DataFrame(X, index=frames[sym].index, columns=cols)
+            for sym, _, X in iter_features(frames, cols, "global", chunk)}
+
+
+def add_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Input frame plus the backtest features, rows with any NaN dropped."""
+    return add_features_many({"_": df})["_"]
+
+
+def make_features(df: pd.DataFrame) -> pd.DataFrame:
+    """``FEATS`` plus the next-bar ``TARGET`` for one symbol (no rows dropped)."""
+    return make_features_many({"_": df})["_"]
@@ -0,0 +1,318 @@
+# app/services/forecast.py
+"""In-process forecast engine (global model + per-ticker calibrator).
+
+Runs the same pipeline as ``notebooks/Stock_LSTM_10day.ipynb`` and returns
+the dict the notebook used to write to OUTPUT_JSON.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_squared_error, mean_absolute_percentage_error
+
+from app.services.backtest import FEATURES
+from app.services.windows import windows_ending_at
+from app.services.indicators import indicator_stream
+from app.services.feature_cache import feature_cache
+from app.services import global_model as gm
+from app.services.model_registry import registry
+from app.services.forecast_cache import forecast_cache, make_key
+from app.services.retrain import retrain_scheduler
+
+# Training / loading behavior (mirrors the notebook's parameters cell)
+ENABLE_CALIBRATOR       = True    # learn/apply per-ticker linear adjustment
+AUTO_RETRAIN_ON_NEW     = True    # True => queue tickers missing from the last global training for a background retrain
+
+BUFFER_DAYS = 320
+FETCH_WORKERS = 8
+
+
+def _load_frame(ticker: str, look_back: int, context: int, backtest_horizon: int, interval: str) -> pd.DataFrame:
+    """Pull enough history for the ticker, falling back to shorter periods."""
+    start_date = (
+        pd.Timestamp.utcnow() - pd.Timedelta(days=context + look_back + backtest_horizon + BUFFER_DAYS)
+    ).date().isoformat()
+    need = look_back + backtest_horizon + context + 10
+    try:
+        df = indicator_stream.features(ticker, interval, start=start_date, tail=need, refresh=True)
+        if len(df) < need:
+            raise ValueError("fallback")
+    except Exception:
+        raw = gm.fetch_prices_auto(ticker, interval=interval)
+        df = feature_cache.features(raw)
+
+    df["target_ret"] = df["log_ret"].shift(-1)
+    df = df.dropna()
+    if len(df) < look_back + backtest_horizon + 5:
+        raise ValueError("Not enough rows after feature engineering.")
+    return df
+
+# ---------------------------
+# Pipeline stages (shared by single and batch forecasts)
+# ---------------------------
+
+@dataclass
+class _Prepared:
+    ticker: str
+    df_tail: pd.DataFrame
+    backtest_horizon: int
+    xb_raw: np.ndarray          # (backtest_horizon, look_back, F) 1-step backtest windows
+    last_raw: np.ndarray        # (look_back, F) block feeding the forward forecast
+    prev_prices: np.ndarray
+    actual_prices: np.ndarray
+    backtest_dates: List[str]
+
+
+def _prepare(ticker: str, df: pd.DataFrame, look_back: int, context: int, backtest_horizon: int) -> _Prepared:
+    # Keep just the window we need for context + train + backtest slice (for calibrator)
+    df_tail = df.tail(context + look_back + backtest_horizon)
+    X = df_tail[FEATURES].astype("float32").values
+    close_np = df_tail["Close"].to_numpy()
+
+    # split point for backtest
+    train_end_idx = len(df_tail) - backtest_horizon
+    if train_end_idx <= look_back:
+        train_end_idx = look_back + 1
+        backtest_horizon = max(1, len(df_tail) - train_end_idx)
+
+    ends = np.arange(train_end_idx, train_end_idx + int(backtest_horizon))
+    return _Prepared(
+        ticker=ticker,
+        df_tail=df_tail,
+        backtest_horizon=int(backtest_horizon),
+        xb_raw=windows_ending_at(X, ends, look_back),
+        last_raw=X[-look_back:],
+        prev_prices=close_np[ends - 1].astype("float64"),
+        actual_prices=close_np[ends].astype("float64"),
+        backtest_dates=[pd.Timestamp(df_tail.index[e]).strftime("%Y-%m-%d") for e in ends],
+    )
+
+
+def _scale(blocks: np.ndarray, scaler_X) -> np.ndarray:
+    N, L, F = blocks.shape
+    return scaler_X.transform(blocks.reshape(N * L, F)).reshape(N, L, F)
+
+
+def _actual_rets(p: _Prepared) -> np.ndarray:
+    return (p.actual_prices - p.prev_prices) / np.where(p.prev_prices != 0, p.prev_prices, 1.0)
+
+
+def _fit_calibrator(pred_rets: np.ndarray, actual_rets: np.ndarray) -> Tuple[float, float] | None:
+    if len(pred_rets) < 5:
+        return None
+    A = np.vstack([pred_rets, np.ones(len(pred_rets))]).T
+    sol, *_ = np.linalg.lstsq(A, actual_rets, rcond=None)
+    return float(sol[0]), float(sol[1])
+
+
+def _assemble(
+    p: _Prepared,
+    backtest_pred_rets: np.ndarray,
+    next_rets: np.ndarray,
+    look_back: int,
+    context: int,
+    horizon: int,
+    interval: str,
+) -> Dict[str, Any]:
+    backtest_pred_prices = p.prev_prices * np.exp(backtest_pred_rets)
+    rmse = float(np.sqrt(mean_squared_error(p.actual_prices, backtest_pred_prices)))
+    mape = float(mean_absolute_percentage_error(p.actual_prices, backtest_pred_prices) * 100)
+    actual_rets = _actual_rets(p)
+    acc = float((np.sign(backtest_pred_rets) == np.sign(actual_rets)).mean() * 100.0) if len(actual_rets) else 0.0
+
+    close_np = p.df_tail["Close"].to_numpy()
+    last_price = float(close_np[-1])
+    future_pred_prices = (last_price * np.exp(np.cumsum(next_rets))).astype(float)
+    expected_move_pct = float((float(future_pred_prices[-1]) - last_price) / (last_price if last_price != 0 else 1.0) * 100.0)
+
+    # Unified series for frontend (context actuals + backtest preds + future preds)
+    series_map: Dict[str, Dict[str, Any]] = {}
+    ctx_tail = p.df_tail.tail(int(context))
+    for d, px in zip(ctx_tail.index, ctx_tail["Close"].astype(float).values):
+        ds = pd.Timestamp(d).strftime("%Y-%m-%d")
+        row = series_map.get(ds, {"date": ds}); row["actual"] = float(px); row.setdefault("part", "context"); series_map[ds] = row
+
+    for dstr, px in zip(p.backtest_dates, backtest_pred_prices):
+        row = series_map.get(dstr, {"date": dstr}); row["pred"] = float(px); row["part"] = "backtest"; series_map[dstr] = row
+
+    has_weekends = gm.infer_freq_has_weekends(p.df_tail.index)
+    future_dates = gm.next_dates(p.df_tail.index[-1], int(horizon), use_weekends=has_weekends)
+    for d, px in zip(future_dates, future_pred_prices):
+        ds = pd.Timestamp(d).strftime("%Y-%m-%d")
+        row = series_map.get(ds, {"date": ds}); row["pred"] = float(px); row["part"] = "forecast"; series_map[ds] = row
+
+    return {
+        "ticker": p.ticker,
+        "interval": interval,
+        "look_back": int(look_back),
+        "context": int(context),
+        "backtest_horizon": p.backtest_horizon,
+        "horizon": int(horizon),
+        "metrics": {
+            "rmse": rmse,
+            "mape": mape,
+            "accuracy_pct": acc,
+            "expected_10d_move_pct": expected_move_pct,
+        },
+        "forecast": sorted(series_map.values(), key=lambda r: r["date"]),
+    }
+
+
+class ModelNotReady(RuntimeError):
+    """No global model on disk yet; it is being trained in the background."""
+
+
+def _require_global_model(look_back: int, horizon: int):
+    """Requests never train inline: a missing model is handed to the retrain scheduler."""
+    if gm.artifacts_ready():
+        return
+    if retrain_scheduler.request_initial(look_back, horizon):
+        raise ModelNotReady("Global model is not trained yet; initial training is running in the background, retry later.")
+    raise ModelNotReady("Global model artifacts not found and RETRAIN_ENABLED=0; train the global model first.")
+
+
+def _cache_key(ticker, df, look_back, context, backtest_horizon, horizon, interval, version):
+    # Output only changes when a new bar arrives or the model is retrained
+    return make_key(ticker, look_back, context, backtest_horizon, horizon, interval,
+                    pd.Timestamp(df.index[-1]).isoformat(), version)
+
+# ---------------------------
+# Entry points
+# ---------------------------
+
+def run_forecast(
+    ticker: str,
+    look_back: int,
+    context: int,
+    backtest_horizon: int,
+    horizon: int,
+    interval: str = "1d",
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    ticker = ticker.upper()
+
+    # 0) Nothing is trained inline. A brand-new symbol is answered by the current
+    #    global model + a freshly fitted calibrator and folded in later.
+    _require_global_model(look_back, horizon)
+
+    # 1) Data + cache lookup; global scalers/models come from the warm registry
+    df = _load_frame(ticker, look_back, context, backtest_horizon, interval)
+    # queued only once it has loaded, so unknown tickers never reach the retrainer
+    if AUTO_RETRAIN_ON_NEW and not gm.was_in_last_training(ticker):
+        retrain_scheduler.enqueue(ticker)
+    art = registry.get()
+    cache_key = _cache_key(ticker, df, look_back, context, backtest_horizon, horizon, interval, art.version)
+    if use_cache and (hit := forecast_cache.get(cache_key)) is not None:
+        return hit
+
+    p = _prepare(ticker, df, look_back, context, backtest_horizon)
+    sid = registry.symbol_id(ticker)
+
+    # 2) Backtest the last backtest_horizon days (1-step each) in a single predict call
+    y1_s = art.one(_scale(p.xb_raw, art.scaler_X), np.full((len(p.xb_raw),), sid, dtype="int32"))
+    backtest_pred_rets = art.scaler_Y.inverse_transform(y1_s.reshape(-1, 1))[:, 0].astype("float64")
+
+    # 3) Multi-step forward forecast of next horizon sessions + optional per-ticker calibrator
+    next_rets = art.multi(_scale(p.last_raw[None], art.scaler_X), [sid])[0].astype("float64")
+    if ENABLE_CALIBRATOR:
+        ab = _fit_calibrator(backtest_pred_rets, _actual_rets(p))
+        if ab is not None:
+            registry.set_calibrator(sid, *ab)
+        cal = ab or registry.calibrator(sid)
+        if cal is not None:
+            next_rets = cal[0] * next_rets + cal[1]
+
+    result = _assemble(p, backtest_pred_rets, next_rets, look_back, context, horizon, interval)
+    forecast_cache.set(cache_key, result)
+    return result
+
+
+def run_forecast_batch(
+    tickers: List[str],
+    look_back: int,
+    context: int,
+    backtest_horizon: int,
+    horizon: int,
+    interval: str = "1d",
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """
+    Forecast many tickers with one forward pass per model.
+
+    Windows for every ticker are stacked and scored in a single ``predict``
+    call (the ``sid_in`` embedding tells symbols apart), and calibrators are
+    fitted and applied as arrays. Unlike ``run_forecast`` this never
+    retrains the global model; unseen tickers are scored with it as-is.
+    """
+    tickers = list(dict.fromkeys(t.upper().strip() for t in tickers if t.strip()))
+    _require_global_model(look_back, horizon)
+    art = registry.get()
+
+    results: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+
+    def load(t):
+        try:
+            return t, _load_frame(t, look_back, context, backtest_horizon, interval), None
+        except Exception as e:
+            return t, None, str(e)
+
+    # 1) Fetch in parallel, answer cache hits, prepare the rest
+    preps: List[_Prepared] = []
+    keys: Dict[str, tuple] = {}
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as ex:
+        for t, df, err in ex.map(load, tickers):
+            if err is not None:
+                errors[t] = err
+                continue
+            keys[t] = _cache_key(t, df, look_back, context, backtest_horizon, horizon, interval, art.version)
+            if use_cache and (hit := forecast_cache.get(keys[t])) is not None:
+                results[t] = hit
+                continue
+            try:
+                preps.append(_prepare(t, df, look_back, context, backtest_horizon))
+            except Exception as e:
+                errors[t] = str(e)
+
+    if preps:
+        sid_map = registry.symbol_ids([p.ticker for p in preps])
+        sids = np.array([sid_map[p.ticker] for p in preps], dtype="int32")
+        counts = np.array([len(p.xb_raw) for p in preps])
+
+        # 2) One vectorized pass for every backtest window and every forward block
+        xb = _scale(np.concatenate([p.xb_raw for p in preps]), art.scaler_X)
+        y1_s = art.one(xb, np.repeat(sids, counts))
+        bt_rets = art.scaler_Y.inverse_transform(y1_s.reshape(-1, 1))[:, 0].astype("float64")
+        bt_split = np.split(bt_rets, np.cumsum(counts)[:-1])
+        next_rets = art.multi(_scale(np.stack([p.last_raw for p in preps]), art.scaler_X), sids).astype("float64")
+
+        # 3) Calibrators: fit per ticker, write the changed rows, apply as a gather
+        if ENABLE_CALIBRATOR:
+            fitted_sids, fitted_ab = [], []
+            for sid, p, r in zip(sids, preps, bt_split):
+                ab = _fit_calibrator(r, _actual_rets(p))
+                if ab is not None:
+                    fitted_sids.append(sid)
+                    fitted_ab.append(ab)
+            if fitted_sids:
+                registry.set_calibrators(np.array(fitted_sids), np.array(fitted_ab))
+            a, b = registry.calibrators(sids)
+            next_rets = a[:, None] * next_rets + b[:, None]
+
+        for i, p in enumerate(preps):
+            res = _assemble(p, bt_split[i], next_rets[i], look_back, context, horizon, interval)
+            forecast_cache.set(keys[p.ticker], res)
+            results[p.ticker] = res
+
+    return {
+        "look_back": int(look_back),
+        "context": int(context),
+        "backtest_horizon": int(backtest_horizon),
+        "horizon": int(horizon),
+        "results": {t: results[t] for t in tickers if t in results},
+        "errors": errors,
+    }
@@ -0,0 +1,177 @@
+# app/services/forecast_cache.py
+"""LRU cache for forecast results with an optional on-disk tier.
+
+Keys include the last market bar and the model artifact version, so an entry
+stays valid until a new bar arrives or the global model is retrained. As with
+the feature and model caches, a disk hit refreshes the file's mtime and the
+least recently used files are evicted once the directory grows past
+``FORECAST_CACHE_MAX_MB``.
+"""
+from __future__ import annotations
+
+import os
+import gzip
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+from app.core.config import logger
+
+CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", "256"))
+CACHE_DIR = os.getenv("FORECAST_CACHE_DIR", "")  # empty => memory only
+CACHE_MAX_MB = float(os.getenv("FORECAST_CACHE_MAX_MB", "64"))
+
+
+def make_key(
+    ticker: str,
+    look_back: int,
+    context: int,
+    backtest_horizon: int,
+    horizon: int,
+    interval: str,
+    last_bar: str,
+    model_version: str | None,
+) -> Tuple:
+    return (ticker.upper(), int(look_back), int(context), int(backtest_horizon),
+            int(horizon), interval, last_bar, model_version or "")
+
+
+class ForecastCache:
+    def __init__(self, max_entries: int = CACHE_SIZE, disk_dir: str | None = CACHE_DIR,
+                 max_mb: float = CACHE_MAX_MB):
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._mem: OrderedDict[Tuple, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self._files: Dict[str, Tuple[int, float]] | None = None   # file name -> (bytes, last use), loaded lazily
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+    def _path(self, key: Tuple) -> Path:
+        digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()
+        return self.disk_dir / f"{digest}.json.gz"
+
+    def _index(self) -> Dict[str, Tuple[int, float]]:
+        if self._files is None:
+            self._files, self._bytes = {}, 0
+            if self.disk_dir and self.disk_dir.exists():
+                for p in self.disk_dir.glob("*.json.gz"):
+                    try:
+                        st = p.stat()
+                    except FileNotFoundError:
+                        continue
+                    self._files[p.name] = (st.st_size, st.st_mtime)
+                    self._bytes += st.st_size
+        return self._files
+
+    def _evict(self):
+        files = self._index()
+        for name, (size, _) in sorted(files.items(), key=lambda kv: kv[1][1]):
+            if self._bytes <= self.max_bytes:
+                break
+            (self.disk_dir / name).unlink(missing_ok=True)
+            del files[name]
+            self._bytes -= size
+            self.disk_evictions += 1
+
+    def _put_mem(self, key: Tuple, val: Any):
+        if key in self._mem:
+            self._mem.move_to_end(key)
+        self._mem[key] = val
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: Tuple):
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return self._mem[key]
+        if self.disk_dir:
+            p = self._path(key)
+            try:
+                with gzip.open(p, "rt") as f:
+                    val = json.load(f)
+                os.utime(p)   # mark as recently used for LRU eviction
+            except FileNotFoundError:
+                val = None
+            except Exception as e:
+                logger.warning("Dropping unreadable forecast cache entry %s: %s", p.name, e)
+                p.unlink(missing_ok=True)
+                val = None
+            if val is not None:
+                with self._lock:
+                    files = self._index()
+                    if p.name in files:
+                        files[p.name] = (files[p.name][0], os.path.getmtime(p))
+                    self._put_mem(key, val)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return val
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: Tuple, val: Any):
+        with self._lock:
+            self._put_mem(key, val)
+        if self.disk_dir:
+            p = self._path(key)
+            tmp = p.with_name(f"{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                with gzip.open(tmp, "wt") as f:
+                    json.dump(val, f)
+                os.replace(tmp, p)
+                st = p.stat()
+            except Exception as e:
+                logger.warning("Could not persist forecast cache entry: %s", e)
+                tmp.unlink(missing_ok=True)
+                return
+            with self._lock:
+                files = self._index()
+                old = files.get(p.name)
+                files[p.name] = (st.st_size, st.st_mtime)
+                self._bytes += st.st_size - (old[0] if old else 0)
+                self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self.disk_dir:
+                for p in self.disk_dir.glob("*.json.gz"):
+                    p.unlink(missing_ok=True)
+            self._files, self._bytes = {}, 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            if self.disk_dir:
+                self._index()
+            return {
+                "size": len(self._mem),
+                "maxSize": self.max_entries,
+                "hits": self.hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "diskEntries": len(self._files or {}),
+                "diskMB": round(self._bytes / 1024 / 1024, 2),
+                "maxMB": round(self.max_bytes / 1024 / 1024, 2),
+                "diskEvictions": self.disk_evictions,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "disk": str(self.disk_dir) if self.disk_dir else None,
+            }
+
+
+forecast_cache = ForecastCache()
@@ -0,0 +1,210 @@
+# app/services/global_model.py
+"""Global multi-asset LSTM helpers shared by the forecast engine.
+
+Ported from the helper cell of ``notebooks/Stock_LSTM_10day.ipynb`` so the
+API can use the same artifacts without spinning up a Jupyter kernel.
+"""
+from __future__ import annotations
+
+import os
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from joblib import dump
+from sklearn.preprocessing import StandardScaler
+import tensorflow as tf
+
+from app.core.config import logger
+from app.services.features import iter_features, FEATURES
+from app.services.windows import make_windows
+from app.services.price_store import price_store
+from app.services.symbol_index import SymbolIndex
+from app.services.calibrators import CalibratorTable
+
+# ---------------------------
+# Artifact locations
+# ---------------------------
+
+ARTIFACTS_DIR = Path(os.getenv("ARTIFACTS_DIR", "artifacts"))
+GLOBAL_MODEL_M = ARTIFACTS_DIR / "global_lstm_multi.keras"   # HORIZON-step model
+GLOBAL_MODEL_1 = ARTIFACTS_DIR / "global_lstm_one.keras"     # 1-step model
+GLOBAL_SCALER_X = ARTIFACTS_DIR / "global_scaler_X.joblib"
+GLOBAL_SCALER_Y = ARTIFACTS_DIR / "global_scaler_Y.joblib"    # for 1-step returns
+REGISTRY_PATH = ARTIFACTS_DIR / "symbol_index.json"
+CALIBRATORS_JSON = ARTIFACTS_DIR / "calibrators.json"      # legacy, migrated into CALIBRATORS_NPY
+CALIBRATORS_NPY = ARTIFACTS_DIR / "calibrators.npy"        # (MAX_SYMBOLS, 2) rows of (a, b) by symbol id
+TRAINED_SET_PATH = ARTIFACTS_DIR / "global_trained_symbols.json"  # snapshot of last global training universe
+
+# Where to read a big training universe (one symbol per line)
+TICKERS_FILE = os.getenv("TICKERS_FILE", "tickers_1000_plus.txt")
+
+DEFAULT_UNIVERSE = [
+    "SPY","QQQ","IWM","EFA","EEM","GLD","SLV","TLT","HYG","XLF","XLE","XLY","XLK","XLV","XLI","XLP","XLB","XLU","VNQ","ARKK",
+    "AAPL","MSFT","GOOGL","AMZN","NVDA","META","TSLA","BRK-B","JPM","V","JNJ","WMT","PG","UNH","MA","HD","XOM","BAC","PFE","DIS",
+    "BTC-USD","ETH-USD","SOL-USD","BNB-USD","XRP-USD","ADA-USD","DOGE-USD",
+]
+
+MAX_SYMBOLS = 20000
+
+
+def load_universe(path: str = TICKERS_FILE) -> list[str]:
+    p = Path(path)
+    if p.exists():
+        return [l.strip() for l in p.read_text().splitlines() if l.strip()]
+    return list(DEFAULT_UNIVERSE)
+
+# ---------------------------
+# Symbol registry + calibrators
+# ---------------------------
+
+# ids are claimed under a file lock and writes are batched; see app/services/symbol_index.py
+symbol_index = SymbolIndex(REGISTRY_PATH, MAX_SYMBOLS)
+
+def _ensure_sid(symbol: str) -> int:
+    return symbol_index.ensure(symbol)
+
+calibrators = CalibratorTable(CALIBRATORS_NPY, MAX_SYMBOLS, symbol_index, legacy_json=CALIBRATORS_JSON)
+
+def release_symbol(symbol: str) -> bool:
+    """Forget ``symbol``; an id whose embedding row was trained is not reused until the next full training."""
+    return symbol_index.release(symbol, retire=was_in_last_training(symbol))
+
+def was_in_last_training(symbol: str) -> bool:
+    try:
+        symbols = json.loads(TRAINED_SET_PATH.read_text())
+        return symbol.upper() in {s.upper() for s in symbols}
+    except Exception:
+        return False
+
+def add_symbol_to_universe_file(symbol: str, path: str = TICKERS_FILE):
+    p = Path(path)
+    lines = set()
+    if p.exists():
+        lines = {l.strip() for l in p.read_text().splitlines() if l.strip()}
+    lines.add(symbol.upper())
+    p.write_text("\n".join(sorted(lines)))
+
+# ---------------------------
+# Data
+# ---------------------------
+
+def fetch_prices_auto(ticker: str, interval="1d") -> pd.DataFrame:
+    for p in ["1y","150d","90d","60d","30d"]:
+        try:
+            df = price_store.get(ticker, interval=interval, period=p)
+            if not df.empty:
+                df = df[["Open","High","Low","Close","Volume"]].dropna()
+                if not df.empty:
+                    return df
+        except Exception:
+            pass
+    raise ValueError("No data for any fallback period.")
+
+# ---------------------------
+# Model + training
+# ---------------------------
+
+def build_global_model(input_steps: int, n_features: int, horizon: int) -> tf.keras.Model:
+    ts_in  = tf.keras.Input(shape=(input_steps, n_features), name="ts_in")
+    sid_in = tf.keras.Input(shape=(), dtype="int32", name="sid_in")
+    emb = tf.keras.layers.Embedding(MAX_SYMBOLS, 16, name="sym_emb")(sid_in)
+    emb_r = tf.keras.layers.RepeatVector(input_steps)(emb)
+    x = tf.keras.layers.Concatenate()([ts_in, emb_r])
+    x = tf.keras.layers.Conv1D(48, kernel_size=5, padding="causal", activation="relu")(x)
+    x = tf.keras.layers.Dropout(0.2)(x)
+    x = tf.keras.layers.Bidirectional(tf.keras.layers.LSTM(160, return_sequences=True))(x)
+    x = tf.keras.layers.Dropout(0.3)(x)
+    x = tf.keras.layers.LSTM(96)(x)
+    out = tf.keras.layers.Dense(horizon, name="step_returns")(x)
+    m = tf.keras.Model([ts_in, sid_in], out, name="global_lstm_multiasset")
+    m.compile(optimizer=tf.keras.optimizers.Adam(1e-3), loss="mse")
+    return m
+
+def _apply_scaler_global(X: np.ndarray, sc: StandardScaler) -> np.ndarray:
+    N, L, F = X.shape
+    flat = sc.transform(X.reshape(N*L, F))
+    return flat.reshape(N, L, F)
+
+def _build_dataset_for_universe(tickers: list, lookback: int, horizon: int, interval: str = "1d",
+                                scaler: StandardScaler | None = None):
+    """
+    Windows, horizon targets and symbol ids for every ticker with enough history,
+    plus the list of tickers that actually contributed windows.
+    A ``scaler`` passed in is ``partial_fit`` on each symbol's bars under the
+    windows, one row per bar, instead of the N*L rows of the windowed tensor.
+    """
+    frames = {}
+    for s in tickers:
+        try:
+            frames[s] = fetch_prices_auto(s, interval=interval)
+        except Exception:
+            continue
+    Xs, ys, used = [], [], []
+    for s, _, F in iter_features(frames, FEATURES + ["ret"], "backtest"):
+        Xw, Yw = make_windows(F[:, :-1], F[:, -1], lookback, horizon)
+        if len(Xw) == 0: continue
+        if scaler is not None:
+            scaler.partial_fit(F[:len(F) - horizon, :-1])   # rows [0, n-H) are the window inputs
+        Xs.append(Xw)
+        ys.append(Yw)
+        used.append(s)
+    if not Xs:
+        raise ValueError("No training samples from the provided universe.")
+    # claim ids only now: the index's file lock is held for this short batch, not the feature pass
+    sid_map = symbol_index.ensure_many(used)
+    sids = [np.full((len(Xw),), sid_map[s.upper().strip()], dtype="int32") for s, Xw in zip(used, Xs)]
+    X = np.concatenate(Xs, axis=0)
+    Y = np.concatenate(ys, axis=0)
+    S = np.concatenate(sids, axis=0)
+    return X, Y, S, used
+
+def artifacts_ready() -> bool:
+    return all(p.exists() for p in (GLOBAL_MODEL_M, GLOBAL_MODEL_1, GLOBAL_SCALER_X, GLOBAL_SCALER_Y))
+
+def ensure_global_trained(lookback: int, horizon: int, tickers: list | None = None, interval: str = "1d", force: bool = False):
+    if not force and artifacts_ready():
+        return
+    ARTIFACTS_DIR.mkdir(parents=True, exist_ok=True)
+    tickers = tickers or load_universe()
+    logger.info("Training global LSTM on %d symbols (L=%d, H=%d)", len(tickers), lookback, horizon)
+    scX = StandardScaler()
+    X, Y, S, used = _build_dataset_for_universe(tickers, lookback, horizon, interval=interval, scaler=scX)
+    Xs  = _apply_scaler_global(X, scX)
+    # multi-step model
+    mM = build_global_model(lookback, Xs.shape[-1], horizon)
+    mM.fit({"ts_in":Xs,"sid_in":S}, Y, epochs=18, batch_size=256, verbose=0)
+    mM.save(GLOBAL_MODEL_M)
+    dump(scX, GLOBAL_SCALER_X)
+    # one-step model
+    Y1 = Y[:, :1]
+    m1 = build_global_model(lookback, Xs.shape[-1], 1)
+    m1.fit({"ts_in":Xs,"sid_in":S}, Y1, epochs=12, batch_size=256, verbose=0)
+    m1.save(GLOBAL_MODEL_1)
+    scY = StandardScaler().fit(Y1.reshape(-1,1))
+    dump(scY, GLOBAL_SCALER_Y)
+    # snapshot which symbols trained the current global weights
+    tmp = TRAINED_SET_PATH.with_name(f"{TRAINED_SET_PATH.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(sorted(set(used)), indent=2))
+    os.replace(tmp, TRAINED_SET_PATH)
+    # fresh weights: no embedding row of a released symbol survives
+    symbol_index.clear_retired()
+
+# ---------------------------
+# Calendar helpers
+# ---------------------------
+
+def infer_freq_has_weekends(idx: pd.Index) -> bool:
+    try:
+        wd = pd.Index([pd.Timestamp(x).weekday() for x in idx])
+        return (wd >= 5).any()
+    except Exception:
+        return False
+
+def next_dates(last_date, n: int, use_weekends: bool) -> list:
+    last_ts = pd.Timestamp(last_date)
+    if use_weekends:
+        rng = pd.date_range(last_ts, periods=n+1, freq="D"); return [d for d in rng[1:]]
+    else:
+        rng = pd.bdate_range(last_ts, periods=n+1); return [d for d in rng[1:]]
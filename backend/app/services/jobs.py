@@ -0,0 +1,197 @@
+# app/services/jobs.py
+"""Bounded in-memory job tables with on-disk result blobs.
+
+Drop-in replacement for the plain ``dict`` job tables used by the routes:
+entries expire ``JOB_TTL_S`` seconds after their last update, the table is
+capped at ``JOB_MAX_ENTRIES`` (oldest finished jobs go first), and finished
+results are written to gzip JSON blobs so only small status dicts stay in RAM.
+Queued and running jobs are never evicted.
+
+Each store writes its blobs to its own ``<name>/<pid>-<suffix>`` directory,
+removed at exit; directories of processes that are no longer alive are
+cleaned up when a store starts, so several workers can share ``JOB_BLOB_DIR``.
+"""
+from __future__ import annotations
+
+import os
+import gzip
+import uuid
+import atexit
+import shutil
+import json
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+from app.core.config import logger
+
+JOB_TTL_S = float(os.getenv("JOB_TTL_S", "3600"))
+JOB_MAX_ENTRIES = int(os.getenv("JOB_MAX_ENTRIES", "1000"))
+JOB_BLOB_DIR = os.getenv("JOB_BLOB_DIR", os.path.join(tempfile.gettempdir(), "stock-predictor-jobs"))
+
+TERMINAL = {"done", "error", "cancelled"}
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _remove_orphans(root: Path, ttl: float):
+    """Delete blob directories of processes that have exited (and expired blobs of the old flat layout)."""
+    if not root.exists():
+        return
+    for p in root.iterdir():
+        if p.is_file() and p.name.endswith(".json.gz"):
+            if time.time() - p.stat().st_mtime > ttl:
+                p.unlink(missing_ok=True)
+            continue
+        pid = p.name.split("-", 1)[0]
+        if p.is_dir() and pid.isdigit() and not _pid_alive(int(pid)):
+            shutil.rmtree(p, ignore_errors=True)
+
+
+class JobStore:
+    _instances: Dict[str, "JobStore"] = {}
+
+    def __init__(self, name: str, ttl: float = JOB_TTL_S, max_entries: int = JOB_MAX_ENTRIES,
+                 blob_dir: str | None = JOB_BLOB_DIR):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.blob_dir = Path(blob_dir) / name / f"{os.getpid()}-{uuid.uuid4().hex[:8]}" if blob_dir else None
+        if self.blob_dir:
+            _remove_orphans(self.blob_dir.parent, ttl)
+            self.blob_dir.mkdir(parents=True, exist_ok=True)
+            atexit.register(shutil.rmtree, self.blob_dir, ignore_errors=True)
+        self._items: OrderedDict[str, Tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted_ttl = 0
+        self.evicted_size = 0
+        self.offloaded = 0
+        JobStore._instances[name] = self
+
+    # ----- blobs -----
+
+    def _blob_path(self, job_id: str) -> Path:
+        return self.blob_dir / f"{job_id}.json.gz"
+
+    def _offload(self, job_id: str, entry: dict) -> dict:
+        if not self.blob_dir or "result" not in entry or entry.get("state") != "done":
+            return entry
+        path = self._blob_path(job_id)
+        try:
+            with gzip.open(path, "wt") as f:
+                json.dump(entry["result"], f, default=float)
+        except Exception as e:
+            logger.warning("Keeping %s job %s result in memory: %s", self.name, job_id, e)
+            return entry
+        self.offloaded += 1
+        slim = {k: v for k, v in entry.items() if k != "result"}
+        slim["_blob"] = str(path)
+        return slim
+
+    def _drop(self, job_id: str, entry: dict):
+        blob = entry.get("_blob")
+        if blob:
+            Path(blob).unlink(missing_ok=True)
+
+    # ----- eviction -----
+
+    def _evict(self):
+        # items are ordered by last update; unfinished jobs stay however old they are
+        cutoff = time.time() - self.ttl
+        for job_id, (ts, entry) in list(self._items.items()):
+            if ts >= cutoff:
+                break
+            if entry.get("state") not in TERMINAL:
+                continue
+            del self._items[job_id]
+            self._drop(job_id, entry)
+            self.evicted_ttl += 1
+        if len(self._items) <= self.max_entries:
+            return
+        for job_id in [k for k, (_, e) in self._items.items() if e.get("state") in TERMINAL]:
+            if len(self._items) <= self.max_entries:
+                break
+            _, entry = self._items.pop(job_id)
+            self._drop(job_id, entry)
+            self.evicted_size += 1
+
+    # ----- mapping API -----
+
+    def __setitem__(self, job_id: str, entry: dict):
+        entry = self._offload(job_id, dict(entry))
+        with self._lock:
+            old = self._items.pop(job_id, None)
+            if old is not None and old[1].get("_blob") and old[1]["_blob"] != entry.get("_blob"):
+                self._drop(job_id, old[1])
+            self._items[job_id] = (time.time(), entry)
+            self._evict()
+
+    def peek(self, job_id: str) -> dict | None:
+        """Stored status without loading an offloaded result."""
+        with self._lock:
+            item = self._items.get(job_id)
+        return item[1] if item else None
+
+    def get(self, job_id: str, default: Any = None) -> dict | Any:
+        entry = self.peek(job_id)
+        if entry is None:
+            return default
+        blob = entry.get("_blob")
+        if not blob:
+            return entry
+        out = {k: v for k, v in entry.items() if k != "_blob"}
+        try:
+            with gzip.open(blob, "rt") as f:
+                out["result"] = json.load(f)
+        except FileNotFoundError:
+            return {"state": "error", "message": "Job result expired"}
+        return out
+
+    def __getitem__(self, job_id: str) -> dict:
+        out = self.get(job_id)
+        if out is None:
+            raise KeyError(job_id)
+        return out
+
+    def __contains__(self, job_id: object) -> bool:
+        with self._lock:
+            return job_id in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._evict()
+            states: Dict[str, int] = {}
+            blobs = 0
+            for _, e in self._items.values():
+                states[e.get("state", "?")] = states.get(e.get("state", "?"), 0) + 1
+                blobs += 1 if e.get("_blob") else 0
+            blob_bytes = sum(p.stat().st_size for p in self.blob_dir.glob("*.json.gz")) if self.blob_dir else 0
+            return {
+                "size": len(self._items),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl,
+                "states": states,
+                "offloadedResults": blobs,
+                "blobBytes": blob_bytes,
+                "offloadedTotal": self.offloaded,
+                "evictedTtl": self.evicted_ttl,
+                "evictedSize": self.evicted_size,
+            }
+
+    @classmethod
+    def all_stats(cls) -> dict:
+        return {name: store.stats() for name, store in cls._instances.items()}
@@ -0,0 +1,201 @@
+# app/services/model_cache.py
+"""Size-bounded on-disk cache of fitted backtest models.
+
+``run_backtest_last`` trains on every bar up to its evaluation block. That
+block only moves when a new bar arrives, so an entry is keyed by (ticker,
+look_back, horizon, last training bar) and holds what is needed to predict
+again without training: the Keras weights plus the statistics of both
+scalers. Entries are uncompressed ``.npz`` files under
+``BACKTEST_MODEL_CACHE_DIR``. As with the feature cache, a hit refreshes
+the file's mtime and the least recently used files are evicted once the
+directory grows past ``BACKTEST_MODEL_CACHE_MAX_MB``.
+"""
+from __future__ import annotations
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.core.config import logger
+
+MODEL_CACHE_DIR = os.getenv("BACKTEST_MODEL_CACHE_DIR", "data/backtest_models")   # empty => memory only
+MODEL_CACHE_MAX_MB = float(os.getenv("BACKTEST_MODEL_CACHE_MAX_MB", "256"))
+MODEL_CACHE_MEM = int(os.getenv("BACKTEST_MODEL_CACHE_MEM", "16"))                 # entries kept in RAM
+
+# bump when build_model or the backtest feature set changes shape
+MODEL_CACHE_VERSION = 1
+
+
+def make_key(ticker: str, look_back: int, horizon: int, last_train_bar: str) -> str:
+    parts = [ticker.upper(), int(look_back), int(horizon), last_train_bar, MODEL_CACHE_VERSION]
+    return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+
+class FittedModel:
+    """Weights of a trained model plus the scaler statistics it was trained with."""
+
+    def __init__(self, weights: List[np.ndarray], x_mean: np.ndarray, x_scale: np.ndarray,
+                 y_mean: float, y_scale: float):
+        self.weights = weights
+        self.x_mean = x_mean
+        self.x_scale = x_scale
+        self.y_mean = float(y_mean)
+        self.y_scale = float(y_scale)
+
+    @classmethod
+    def capture(cls, model, scaler_X, scaler_y) -> "FittedModel":
+        return cls(model.get_weights(), scaler_X.mean_, scaler_X.scale_, scaler_y.mean_[0], scaler_y.scale_[0])
+
+    def transform_X(self, X: np.ndarray) -> np.ndarray:
+        return (X - self.x_mean) / self.x_scale
+
+    def inverse_y(self, y: np.ndarray) -> np.ndarray:
+        return y * self.y_scale + self.y_mean
+
+    def dump(self, path: Path):
+        arrays = {f"w{i}": w for i, w in enumerate(self.weights)}
+        with open(path, "wb") as f:
+            np.savez(f, x_mean=self.x_mean, x_scale=self.x_scale,
+                     y=np.array([self.y_mean, self.y_scale]), **arrays)
+
+    @classmethod
+    def load(cls, path: Path) -> "FittedModel":
+        with np.load(path) as z:
+            n = sum(1 for k in z.files if k.startswith("w"))
+            y_mean, y_scale = z["y"]
+            return cls([z[f"w{i}"] for i in range(n)], z["x_mean"], z["x_scale"], y_mean, y_scale)
+
+
+class ModelCache:
+    def __init__(self, disk_dir: str | None = MODEL_CACHE_DIR, max_mb: float = MODEL_CACHE_MAX_MB,
+                 mem_entries: int = MODEL_CACHE_MEM):
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.mem_entries = mem_entries
+        self._mem: OrderedDict[str, FittedModel] = OrderedDict()
+        self._lock = threading.Lock()
+        self._files: Dict[str, Tuple[int, float]] | None = None   # key -> (bytes, last use), loaded lazily
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.npz"
+
+    def _index(self) -> Dict[str, Tuple[int, float]]:
+        if self._files is None:
+            self._files, self._bytes = {}, 0
+            if self.disk_dir and self.disk_dir.exists():
+                for p in self.disk_dir.glob("*.npz"):
+                    try:
+                        st = p.stat()
+                    except FileNotFoundError:
+                        continue
+                    self._files[p.stem] = (st.st_size, st.st_mtime)
+                    self._bytes += st.st_size
+        return self._files
+
+    def _evict(self):
+        files = self._index()
+        for key, (size, _) in sorted(files.items(), key=lambda kv: kv[1][1]):
+            if self._bytes <= self.max_bytes:
+                break
+            self._path(key).unlink(missing_ok=True)
+            del files[key]
+            self._bytes -= size
+            self.evictions += 1
+
+    def _put_mem(self, key: str, fitted: FittedModel):
+        self._mem[key] = fitted
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.mem_entries:
+            self._mem.popitem(last=False)
+
+    def get(self, key: str) -> FittedModel | None:
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return self._mem[key]
+        if self.disk_dir:
+            p = self._path(key)
+            try:
+                fitted = FittedModel.load(p)
+                os.utime(p)   # mark as recently used for LRU eviction
+            except FileNotFoundError:
+                fitted = None
+            except Exception as e:
+                logger.warning("Dropping unreadable model cache entry %s: %s", p.name, e)
+                p.unlink(missing_ok=True)
+                fitted = None
+            if fitted is not None:
+                with self._lock:
+                    files = self._index()
+                    if key in files:
+                        files[key] = (files[key][0], os.path.getmtime(p))
+                    self._put_mem(key, fitted)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return fitted
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, fitted: FittedModel):
+        with self._lock:
+            self._put_mem(key, fitted)
+        if not self.disk_dir:
+            return
+        p = self._path(key)
+        tmp = p.with_name(f"{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            fitted.dump(tmp)
+            os.replace(tmp, p)
+            st = p.stat()
+        except Exception as e:
+            logger.warning("Could not persist model cache entry: %s", e)
+            tmp.unlink(missing_ok=True)
+            return
+        with self._lock:
+            files = self._index()
+            old = files.get(key)
+            files[key] = (st.st_size, st.st_mtime)
+            self._bytes += st.st_size - (old[0] if old else 0)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self.disk_dir:
+                for p in self.disk_dir.glob("*.npz"):
+                    p.unlink(missing_ok=True)
+            self._files, self._bytes = {}, 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            self._index()
+            return {
+                "memEntries": len(self._mem),
+                "diskEntries": len(self._files or {}),
+                "diskMB": round(self._bytes / 1024 / 1024, 2),
+                "maxMB": round(self.max_bytes / 1024 / 1024, 2),
+                "hits": self.hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "disk": str(self.disk_dir) if self.disk_dir else None,
+            }
+
+
+model_cache = ModelCache()
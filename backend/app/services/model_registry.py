@@ -0,0 +1,172 @@
+# app/services/model_registry.py
+"""Process-wide cache of the global LSTM artifacts.
+
+Models, scalers, the symbol index and calibrators are deserialized once and
+reused across requests. File mtimes are polled (at most every
+``MODEL_RELOAD_CHECK_S`` seconds) and a changed artifact set is reloaded and
+swapped in atomically, so retrains are picked up without a restart.
+"""
+from __future__ import annotations
+
+import os
+import time
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+import tensorflow as tf
+from joblib import load
+
+from app.core.config import logger
+from app.services import global_model as gm
+
+RELOAD_CHECK_S = float(os.getenv("MODEL_RELOAD_CHECK_S", "2.0"))
+
+
+class PredictHandle:
+    """Serializes predict calls on a shared Keras model."""
+
+    def __init__(self, model: tf.keras.Model):
+        self.model = model
+        self._lock = threading.Lock()
+
+    @property
+    def input_steps(self) -> int:
+        return int(self.model.inputs[0].shape[1])
+
+    @property
+    def output_steps(self) -> int:
+        return int(self.model.outputs[0].shape[-1])
+
+    def __call__(self, ts: np.ndarray, sids: np.ndarray) -> np.ndarray:
+        sids = np.asarray(sids, dtype="int32").reshape(-1)
+        with self._lock:
+            return self.model.predict({"ts_in": ts, "sid_in": sids}, verbose=0)
+
+
+@dataclass
+class GlobalArtifacts:
+    multi: PredictHandle
+    one: PredictHandle
+    scaler_X: Any
+    scaler_Y: Any
+    version: str
+    mtimes: Dict[str, int] = field(default_factory=dict)
+
+
+def _stat(paths: Dict[str, Path]) -> Dict[str, int]:
+    out = {}
+    for name, p in paths.items():
+        try:
+            out[name] = p.stat().st_mtime_ns
+        except FileNotFoundError:
+            out[name] = 0
+    return out
+
+
+def _version(mtimes: Dict[str, int]) -> str:
+    raw = ",".join(f"{k}:{v}" for k, v in sorted(mtimes.items()))
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._model_paths = {
+            "multi": gm.GLOBAL_MODEL_M,
+            "one": gm.GLOBAL_MODEL_1,
+            "scaler_X": gm.GLOBAL_SCALER_X,
+            "scaler_Y": gm.GLOBAL_SCALER_Y,
+        }
+        self._lock = threading.RLock()
+        self._artifacts: GlobalArtifacts | None = None
+        self._checked_at = 0.0
+        self.loads = 0
+
+    # ----- models + scalers -----
+
+    def _load(self, mtimes: Dict[str, int]) -> GlobalArtifacts:
+        t0 = time.perf_counter()
+        art = GlobalArtifacts(
+            multi=PredictHandle(tf.keras.models.load_model(gm.GLOBAL_MODEL_M)),
+            one=PredictHandle(tf.keras.models.load_model(gm.GLOBAL_MODEL_1)),
+            scaler_X=load(gm.GLOBAL_SCALER_X),
+            scaler_Y=load(gm.GLOBAL_SCALER_Y),
+            version=_version(mtimes),
+            mtimes=mtimes,
+        )
+        self.loads += 1
+        logger.info("Loaded global artifacts %s in %.2fs", art.version, time.perf_counter() - t0)
+        return art
+
+    def get(self) -> GlobalArtifacts:
+        """Return the current artifacts, reloading them if files changed on disk."""
+        now = time.monotonic()
+        art = self._artifacts
+        if art is not None and now - self._checked_at < RELOAD_CHECK_S:
+            return art
+        with self._lock:
+            self._checked_at = time.monotonic()
+            mtimes = _stat(self._model_paths)
+            if self._artifacts is None or mtimes != self._artifacts.mtimes:
+                if not all(mtimes.values()):
+                    raise RuntimeError("Global model artifacts not found; train the global model first.")
+                self._artifacts = self._load(mtimes)
+            return self._artifacts
+
+    def publish(self, staged: Dict[Path, Path]):
+        """
+        Move staged artifact files over the live ones as one unit: readers
+        never reload a half-replaced set because reloads take the same lock.
+        """
+        with self._lock:
+            for src, dst in staged.items():
+                os.replace(src, dst)
+            self._checked_at = 0.0
+            self._artifacts = self._load(_stat(self._model_paths))
+
+    @property
+    def version(self) -> str | None:
+        art = self._artifacts
+        return art.version if art else None
+
+    def warm(self):
+        try:
+            self.get()
+        except Exception as e:
+            logger.warning("Global model warm-up skipped: %s", e)
+
+    # ----- symbol index -----
+
+    def symbol_id(self, symbol: str) -> int:
+        gm.symbol_index.reload_if_changed()
+        return gm.symbol_index.ensure_many([symbol])[symbol.upper().strip()]
+
+    def symbol_ids(self, symbols: list[str]) -> dict[str, int]:
+        """Resolve many symbols, writing the index at most once."""
+        gm.symbol_index.reload_if_changed()
+        return gm.symbol_index.ensure_many(symbols)
+
+    # ----- calibrators -----
+
+    def calibrator(self, sid: int) -> tuple[float, float] | None:
+        return gm.calibrators.get(sid)
+
+    def set_calibrator(self, sid: int, a: float, b: float):
+        gm.calibrators.set(sid, a, b)
+
+    def calibrators(self, sids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """``(a, b)`` arrays for ``sids``; unfitted symbols get the identity."""
+        return gm.calibrators.gather(sids)
+
+    def set_calibrators(self, sids: np.ndarray, ab: np.ndarray):
+        gm.calibrators.set_many(sids, ab)
+
+    def stats(self) -> dict:
+        return {"version": self.version, "loads": self.loads, "symbols": len(gm.symbol_index),
+                "calibrators": gm.calibrators.fitted()}
+
+
+registry = ModelRegistry()
@@ -0,0 +1,188 @@
+# app/services/panel.py
+"""Memory-mapped feature panel for training the global model.
+
+A panel directory holds every symbol's feature rows back to back:
+
+* ``features.f32``  float32 ``(rows, F)``, C-contiguous
+* ``target.f32``    float32 ``(rows,)``, the per-bar target (next-bar return)
+* ``panel.json``    feature names plus, per symbol, its id and ``[start, end)`` row range
+
+Windows are never materialized up front. ``PanelWindows`` enumerates valid
+window starts as plain integer arrays, and ``gather`` slices one batch of
+``(B, L, F)`` windows out of the memmap on demand. Horizon targets come from
+a prefix sum of ``target``. Peak memory is one batch, not the whole ``X``.
+"""
+from __future__ import annotations
+
+import os
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+
+class PanelWriter:
+    """Append symbols one at a time; ``close()`` publishes the panel atomically."""
+
+    def __init__(self, root: Path | str, features: List[str]):
+        self.root = Path(root)
+        self.features = list(features)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._tmp = self.root / f".build-{os.getpid()}"
+        self._tmp.mkdir(exist_ok=True)
+        self._fx = open(self._tmp / "features.f32", "wb")
+        self._fy = open(self._tmp / "target.f32", "wb")
+        self._symbols: List[dict] = []
+        self._rows = 0
+
+    def add(self, symbol: str, sid: int, X: np.ndarray, y: np.ndarray):
+        X = np.ascontiguousarray(X, dtype="float32")
+        y = np.ascontiguousarray(y, dtype="float32").reshape(-1)
+        if X.ndim != 2 or X.shape[1] != len(self.features) or len(X) != len(y):
+            raise ValueError(f"{symbol}: expected ({len(y)}, {len(self.features)}) features, got {X.shape}")
+        X.tofile(self._fx)
+        y.tofile(self._fy)
+        self._symbols.append({"symbol": symbol, "sid": int(sid), "start": self._rows, "end": self._rows + len(X)})
+        self._rows += len(X)
+
+    def close(self) -> "Panel":
+        self._fx.close()
+        self._fy.close()
+        meta = {"features": self.features, "rows": self._rows, "symbols": self._symbols}
+        (self._tmp / "panel.json").write_text(json.dumps(meta))
+        for name in ("features.f32", "target.f32", "panel.json"):   # panel.json last: it marks completeness
+            os.replace(self._tmp / name, self.root / name)
+        self._tmp.rmdir()
+        return Panel(self.root)
+
+
+class Panel:
+    def __init__(self, root: Path | str):
+        self.root = Path(root)
+        meta = json.loads((self.root / "panel.json").read_text())
+        self.features: List[str] = meta["features"]
+        self.rows: int = meta["rows"]
+        self.symbols: List[dict] = meta["symbols"]
+        F = len(self.features)
+        if self.rows:
+            self.X = np.memmap(self.root / "features.f32", dtype="float32", mode="r", shape=(self.rows, F))
+            self.y = np.memmap(self.root / "target.f32", dtype="float32", mode="r", shape=(self.rows,))
+        else:
+            self.X = np.empty((0, F), dtype="float32")
+            self.y = np.empty((0,), dtype="float32")
+        self._by_symbol: Dict[str, dict] = {s["symbol"]: s for s in self.symbols}
+        self._csum: np.ndarray | None = None
+
+    @staticmethod
+    def exists(root: Path | str) -> bool:
+        return (Path(root) / "panel.json").exists()
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, symbol: object) -> bool:
+        return symbol in self._by_symbol
+
+    def rows_of(self, symbol: str) -> Tuple[np.ndarray, np.ndarray]:
+        s = self._by_symbol[symbol]
+        return self.X[s["start"]:s["end"]], self.y[s["start"]:s["end"]]
+
+    def target_sums(self) -> np.ndarray:
+        """Prefix sums of the target (float64, length rows+1) for O(1) horizon sums."""
+        if self._csum is None:
+            c = np.zeros(self.rows + 1, dtype="float64")
+            np.cumsum(self.y, dtype="float64", out=c[1:])
+            self._csum = c
+        return self._csum
+
+    def windows(self, L: int, H: int, symbols: Iterable[str] | None = None) -> "PanelWindows":
+        """
+        Every window ``rows[i-L:i]`` with target ``sum(target[i:i+H])`` that fits
+        inside one symbol's rows (the same windows ``slice_windows`` builds).
+        """
+        picked = self.symbols if symbols is None else [self._by_symbol[s] for s in symbols if s in self._by_symbol]
+        starts, sids = [], []
+        for s in picked:
+            n = s["end"] - s["start"]
+            if n - H + 1 <= L:
+                continue
+            i = np.arange(L, n - H + 1, dtype="int64")
+            starts.append(s["start"] + i - L)
+            sids.append(np.full(len(i), s["sid"], dtype="int32"))
+        if not starts:
+            return PanelWindows(self, L, H, np.empty(0, "int64"), np.empty(0, "int32"))
+        return PanelWindows(self, L, H, np.concatenate(starts), np.concatenate(sids))
+
+    def last_window(self, symbol: str, L: int, H: int) -> np.ndarray | None:
+        """Newest training window of ``symbol`` (matches ``slice_windows(...)[0][-1]``)."""
+        s = self._by_symbol.get(symbol)
+        if s is None:
+            return None
+        n = s["end"] - s["start"] - H + 1
+        if n <= L:
+            return None
+        return np.array(self.X[s["start"] + n - 1 - L:s["start"] + n - 1])
+
+
+class PanelWindows:
+    """Index of windows over a ``Panel``: row offset of each window's first bar plus its symbol id."""
+
+    def __init__(self, panel: Panel, L: int, H: int, starts: np.ndarray, sids: np.ndarray):
+        self.panel = panel
+        self.L = L
+        self.H = H
+        self.starts = starts
+        self.sids = sids
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def time_split(self, val_frac: float, gap: int | None = None) -> Tuple["PanelWindows", "PanelWindows"]:
+        """
+        Split each symbol by time: its newest ``val_frac`` windows validate, the
+        rest train. The ``gap`` training windows right before the cut (default
+        ``H-1``) are dropped so no training target overlaps a validation target.
+        """
+        gap = self.H - 1 if gap is None else gap
+        bounds = np.r_[0, np.flatnonzero(np.diff(self.sids)) + 1, len(self)]   # windows are grouped by symbol
+        tr, va = [], []
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            n_val = int(round((hi - lo) * val_frac))
+            cut = hi - n_val
+            tr.append(np.arange(lo, max(lo, cut - gap) if n_val else hi))
+            va.append(np.arange(cut, hi))
+        empty = np.empty(0, "int64")
+        return self.subset(np.concatenate(tr or [empty])), self.subset(np.concatenate(va or [empty]))
+
+    def subset(self, idx: np.ndarray) -> "PanelWindows":
+        return PanelWindows(self.panel, self.L, self.H, self.starts[idx], self.sids[idx])
+
+    def gather(self, idx: np.ndarray | slice | None = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Materialize windows ``idx`` only: ``X (B, L, F)``, ``y (B,)``, ``sids (B,)``."""
+        starts = self.starts if idx is None else self.starts[idx]
+        rows = starts[:, None] + np.arange(self.L, dtype="int64")
+        X = self.panel.X[rows]
+        c = self.panel.target_sums()
+        t0 = starts + self.L
+        y = (c[t0 + self.H] - c[t0]).astype("float32")
+        sids = self.sids if idx is None else self.sids[idx]
+        return X, y, sids
+
+    def row_mask(self) -> np.ndarray:
+        """Panel rows that fall inside at least one of these windows."""
+        n = self.panel.rows + 1
+        depth = np.bincount(self.starts, minlength=n) - np.bincount(self.starts + self.L, minlength=n)
+        return np.cumsum(depth[:-1]) > 0
+
+    def rows(self, chunk: int = 65536):
+        """The distinct feature rows under these windows (each bar once, not ~L times), ``chunk`` at a time."""
+        idx = np.flatnonzero(self.row_mask())
+        for i in range(0, len(idx), chunk):
+            yield self.panel.X[idx[i:i + chunk]]
+
+    def batches(self, batch_size: int, shuffle: bool = False, seed: int = 0):
+        order = np.random.default_rng(seed).permutation(len(self)) if shuffle else np.arange(len(self))
+        for i in range(0, len(order), batch_size):
+            idx = order[i:i + batch_size]
+            yield self.gather(np.sort(idx) if shuffle else idx)
@@ -0,0 +1,234 @@
+# app/services/price_provider.py
+"""Where bars and quotes come from.
+
+Every price path (price store, cache_prices.py, overview) talks to a
+``PriceProvider`` instead of importing yfinance. ``PRICE_PROVIDER`` picks
+the implementation:
+
+* ``yfinance`` (default): live Yahoo data.
+* ``record``: yfinance, with every response also saved under ``PRICE_RECORD_DIR``.
+* ``replay``: serve saved responses only, after ``PRICE_REPLAY_LATENCY_MS``
+  (+/- ``PRICE_REPLAY_JITTER_MS``), so benchmarks run offline and deterministically.
+"""
+from __future__ import annotations
+
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pandas as pd
+
+logger = logging.getLogger("stock-predictor")   # no app.core import: the CLIs use this module too
+
+PRICE_PROVIDER = os.getenv("PRICE_PROVIDER", "yfinance")
+PRICE_RECORD_DIR = Path(os.getenv("PRICE_RECORD_DIR", "data/recordings"))
+PRICE_REPLAY_LATENCY_MS = float(os.getenv("PRICE_REPLAY_LATENCY_MS", "0"))
+PRICE_REPLAY_JITTER_MS = float(os.getenv("PRICE_REPLAY_JITTER_MS", "0"))
+
+# fast_info / info fields the overview reads
+QUOTE_FIELDS = [
+    "last_price", "last_close", "regular_market_price", "previous_close", "day_low", "day_high",
+    "last_volume", "regular_market_volume", "market_cap", "currency",
+]
+INFO_FIELDS = ["trailingPE", "marketCap"]
+
+
+class PriceProvider:
+    name = "base"
+
+    def download(self, symbols: str | List[str], interval: str = "1d", start=None,
+                 period: str | None = None, group_by: str = "column") -> pd.DataFrame:
+        """Same contract as ``yf.download(..., auto_adjust=True)``."""
+        raise NotImplementedError
+
+    def quote(self, symbol: str) -> Dict[str, Dict[str, Any]]:
+        """``{"fast_info": {...}, "info": {...}}`` restricted to QUOTE_FIELDS / INFO_FIELDS."""
+        raise NotImplementedError
+
+
+class YFinanceProvider(PriceProvider):
+    name = "yfinance"
+
+    def download(self, symbols, interval="1d", start=None, period=None, group_by="column"):
+        import yfinance as yf
+        kw = {"start": start} if start is not None else {"period": period or "max"}
+        return yf.download(symbols, interval=interval, auto_adjust=True, progress=False,
+                           group_by=group_by, threads=False, timeout=30, **kw)
+
+    def quote(self, symbol):
+        import yfinance as yf
+        t = yf.Ticker(symbol.upper())
+        fi = getattr(t, "fast_info", {}) or {}
+        fast = {}
+        for k in QUOTE_FIELDS:
+            try:
+                fast[k] = fi.get(k)
+            except Exception:
+                fast[k] = None
+        try:
+            raw = t.info or {}
+            info = {k: raw.get(k) for k in INFO_FIELDS}
+        except Exception:
+            info = {}
+        return {"fast_info": fast, "info": info}
+
+
+def _request_key(kind: str, **params) -> str:
+    raw = json.dumps({"kind": kind, **params}, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def _symbols_key(symbols) -> str:
+    return ",".join(sorted([symbols] if isinstance(symbols, str) else symbols)).upper()
+
+
+class _Recordings:
+    """
+    On-disk responses: ``<key>.parquet`` for bars, ``<key>.json`` for quotes,
+    plus an index of ``group -> key -> {"file", "rows"}`` for loose matches.
+    The row counts let ``load_any`` pick the longest recording without
+    reading the others.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _index_path(self) -> Path:
+        return self.root / "index.json"
+
+    def _index(self) -> dict:
+        try:
+            idx = json.loads(self._index_path().read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+        for group, entries in idx.items():
+            for key, entry in list(entries.items()):
+                if isinstance(entry, str):   # older index: file name only
+                    if entry.endswith(".pkl.gz"):
+                        logger.warning("Ignoring pickled recording %s; record it again", entry)
+                        del entries[key]
+                    else:
+                        entries[key] = {"file": entry, "rows": 0}
+        return idx
+
+    def save(self, key: str, group: str, obj):
+        self.root.mkdir(parents=True, exist_ok=True)
+        if isinstance(obj, pd.DataFrame):
+            path = self.root / f"{key}.parquet"
+            obj.to_parquet(path)
+            rows = len(obj)
+        else:
+            path = self.root / f"{key}.json"
+            path.write_text(json.dumps(obj, default=str))
+            rows = 0
+        with self._lock:
+            idx = self._index()
+            idx.setdefault(group, {})[key] = {"file": path.name, "rows": rows}
+            tmp = self._index_path().with_name(f"index.json.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(idx, indent=2))
+            os.replace(tmp, self._index_path())
+
+    def _read(self, name: str):
+        path = self.root / name
+        return pd.read_parquet(path) if name.endswith(".parquet") else json.loads(path.read_text())
+
+    def load(self, key: str, group: str):
+        entry = self._index().get(group, {}).get(key)
+        return None if entry is None else self._read(entry["file"])
+
+    def load_any(self, group: str):
+        """Most complete recording for a group (e.g. the longest history of a symbol set)."""
+        entries = self._index().get(group, {}).values()
+        if not entries:
+            return None
+        return self._read(max(entries, key=lambda e: e["rows"])["file"])
+
+
+class RecordingProvider(PriceProvider):
+    name = "record"
+
+    def __init__(self, inner: PriceProvider, root: Path = PRICE_RECORD_DIR):
+        self.inner = inner
+        self.recordings = _Recordings(root)
+
+    def download(self, symbols, interval="1d", start=None, period=None, group_by="column"):
+        df = self.inner.download(symbols, interval=interval, start=start, period=period, group_by=group_by)
+        if df is not None and not df.empty:
+            group = f"bars:{_symbols_key(symbols)}:{interval}:{group_by}"
+            key = _request_key("bars", symbols=_symbols_key(symbols), interval=interval, start=start,
+                               period=period, group_by=group_by)
+            self.recordings.save(key, group, df)
+        return df
+
+    def quote(self, symbol):
+        q = self.inner.quote(symbol)
+        self.recordings.save(_request_key("quote", symbol=symbol.upper()), f"quote:{symbol.upper()}", q)
+        return q
+
+
+class ReplayProvider(PriceProvider):
+    """
+    Serves recorded responses. An exact request match wins; otherwise the
+    longest recording for the same symbols/interval is served, cut to ``start``
+    (the price store asks for different starts as its partitions grow).
+    """
+    name = "replay"
+
+    def __init__(self, root: Path = PRICE_RECORD_DIR, latency_ms: float = PRICE_REPLAY_LATENCY_MS,
+                 jitter_ms: float = PRICE_REPLAY_JITTER_MS, seed: int = 0):
+        self.recordings = _Recordings(root)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _sleep(self):
+        with self._rng_lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        delay = max(0.0, self.latency_ms + jitter) / 1000.0
+        if delay:
+            time.sleep(delay)
+
+    def download(self, symbols, interval="1d", start=None, period=None, group_by="column"):
+        self._sleep()
+        group = f"bars:{_symbols_key(symbols)}:{interval}:{group_by}"
+        key = _request_key("bars", symbols=_symbols_key(symbols), interval=interval, start=start,
+                           period=period, group_by=group_by)
+        df = self.recordings.load(key, group)
+        if df is None:
+            df = self.recordings.load_any(group)
+            if df is None:
+                raise LookupError(f"No recording for {_symbols_key(symbols)} {interval}")
+            if start is not None and len(df):
+                ts = pd.Timestamp(start)
+                tz = getattr(df.index, "tz", None)
+                ts = ts.tz_localize(tz) if tz is not None and ts.tzinfo is None else ts
+                df = df[df.index >= ts]
+        return df.copy()
+
+    def quote(self, symbol):
+        self._sleep()
+        q = self.recordings.load_any(f"quote:{symbol.upper()}")
+        if q is None:
+            raise LookupError(f"No recorded quote for {symbol.upper()}")
+        return q
+
+
+def make_provider(kind: str = PRICE_PROVIDER) -> PriceProvider:
+    if kind == "yfinance":
+        return YFinanceProvider()
+    if kind == "record":
+        return RecordingProvider(YFinanceProvider())
+    if kind == "replay":
+        return ReplayProvider()
+    raise ValueError(f"Unknown PRICE_PROVIDER: {kind}")
+
+
+provider = make_provider()
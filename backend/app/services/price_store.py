@@ -0,0 +1,363 @@
+# app/services/price_store.py
+"""Local OHLCV store shared by every price consumer.
+
+Bars live in ``PRICE_STORE_DIR/<interval>/<SYMBOL>.parquet`` with a small
+``.meta.json`` sidecar (first/last bar, row count, when and from which start
+the data was fetched). A read only goes to the price provider for bars newer than the
+last stored one, once the partition is older than its max age, or when the
+caller asks for history before what was ever downloaded. Everything else is
+served from disk (and a small in-memory LRU of recently read partitions).
+
+Bars are split/dividend adjusted, so a corporate action rewrites the whole
+history. An incremental fetch therefore starts one completed bar back; if
+that bar's Close no longer matches the stored one, the partition is
+refetched in full instead of mixing two price bases. Intraday partitions
+only keep the widest window anyone asked for (``PRICE_INTRADAY_KEEP_DAYS``
+when unbounded).
+"""
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services.price_provider import PriceProvider, provider as default_provider
+
+logger = logging.getLogger("stock-predictor")   # no app.core import: the CLIs use this module too
+
+PRICE_STORE_DIR = Path(os.getenv("PRICE_STORE_DIR", "data/prices"))
+PRICE_MAX_AGE_S = float(os.getenv("PRICE_MAX_AGE_S", "900"))            # daily+ bars
+PRICE_INTRADAY_MAX_AGE_S = float(os.getenv("PRICE_INTRADAY_MAX_AGE_S", "60"))
+PRICE_STORE_MEM = int(os.getenv("PRICE_STORE_MEM", "64"))                # partitions kept in RAM
+PRICE_ADJUST_RTOL = float(os.getenv("PRICE_ADJUST_RTOL", "1e-4"))        # overlap drift that forces a full refetch
+PRICE_INTRADAY_KEEP_DAYS = int(os.getenv("PRICE_INTRADAY_KEEP_DAYS", "60"))
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+_PERIOD_RE = re.compile(r"(\d+)(d|wk|mo|y)")
+
+
+def _is_intraday(interval: str) -> bool:
+    return interval.endswith(("m", "h")) and not interval.endswith("mo")
+
+
+def _normalize(df: pd.DataFrame | None) -> pd.DataFrame:
+    if df is None or df.empty:
+        return pd.DataFrame(columns=COLUMNS)
+    df = df.copy()
+    if isinstance(df.columns, pd.MultiIndex):   # yf.download groups columns by (field, ticker)
+        df.columns = df.columns.get_level_values(0)
+    df.columns = [str(c).title() for c in df.columns]
+    if "Close" not in df.columns and "Adj Close" in df.columns:
+        df["Close"] = df["Adj Close"]
+    df = df[[c for c in COLUMNS if c in df.columns]].dropna(subset=["Close"])
+    df.index = pd.to_datetime(df.index)
+    df.index.name = "Date"
+    return df[~df.index.duplicated(keep="last")].sort_index()
+
+
+def _like(ts, index: pd.Index) -> pd.Timestamp:
+    """Coerce ``ts`` to the timezone-awareness of ``index`` so comparisons work."""
+    ts = pd.Timestamp(ts)
+    tz = getattr(index, "tz", None)
+    if tz is not None:
+        return ts.tz_localize(tz) if ts.tzinfo is None else ts.tz_convert(tz)
+    return ts.tz_localize(None) if ts.tzinfo is not None else ts
+
+
+def _period_start(period: str) -> pd.Timestamp | None:
+    """Calendar start that covers ``period`` (None for ``max``)."""
+    now = pd.Timestamp.utcnow().tz_localize(None).normalize()
+    if period == "max":
+        return None
+    if period == "ytd":
+        return now.replace(month=1, day=1)
+    m = _PERIOD_RE.fullmatch(period)
+    if not m:
+        raise ValueError(f"Unsupported period: {period}")
+    n, unit = int(m.group(1)), m.group(2)
+    if unit == "d":   # trading days; pad for weekends and holidays
+        return now - pd.Timedelta(days=2 * n + 4)
+    off = {"wk": pd.DateOffset(weeks=n), "mo": pd.DateOffset(months=n), "y": pd.DateOffset(years=n)}[unit]
+    return now - off
+
+
+def _slice_period(df: pd.DataFrame, period: str) -> pd.DataFrame:
+    m = _PERIOD_RE.fullmatch(period)
+    if m and m.group(2) == "d":
+        # yfinance's "5d" means the last five sessions, not five calendar days
+        days = pd.Index(df.index.normalize().unique())[-int(m.group(1)):]
+        return df[df.index.normalize().isin(days)]
+    start = _period_start(period)
+    return df if start is None else df[df.index >= _like(start, df.index)]
+
+
+def _covers(covered: str | None, need_from: pd.Timestamp | None) -> bool:
+    if covered is None:
+        return False
+    if covered == "max":
+        return True
+    return need_from is not None and need_from.date().isoformat() >= covered
+
+
+class PriceStore:
+    def __init__(self, root: Path = PRICE_STORE_DIR, mem_entries: int = PRICE_STORE_MEM,
+                 provider: PriceProvider = default_provider):
+        self.root = Path(root)
+        self.provider = provider
+        self.mem_entries = mem_entries
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._mem: OrderedDict[Tuple[str, str], Tuple[int, pd.DataFrame]] = OrderedDict()
+        self._mem_lock = threading.Lock()
+        self.local_hits = 0
+        self.incremental = 0
+        self.full = 0
+        self.readjusted = 0
+
+    # ----- paths + io -----
+
+    def path(self, symbol: str, interval: str) -> Path:
+        return self.root / interval / f"{symbol.upper()}.parquet"
+
+    def _meta_path(self, symbol: str, interval: str) -> Path:
+        return self.root / interval / f"{symbol.upper()}.meta.json"
+
+    def _lock(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def freshness(self, symbol: str, interval: str = "1d") -> dict | None:
+        try:
+            meta = json.loads(self._meta_path(symbol, interval).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        meta["ageSeconds"] = round(time.time() - meta.get("fetchedAt", 0), 1)
+        return meta
+
+    def _read(self, symbol: str, interval: str) -> pd.DataFrame:
+        key = (symbol, interval)
+        p = self.path(symbol, interval)
+        try:
+            mt = p.stat().st_mtime_ns
+        except FileNotFoundError:
+            return _normalize(None)
+        with self._mem_lock:
+            hit = self._mem.get(key)
+            if hit is not None and hit[0] == mt:
+                self._mem.move_to_end(key)
+                return hit[1]
+        df = pd.read_parquet(p)
+        self._remember(key, mt, df)
+        return df
+
+    def _remember(self, key: Tuple[str, str], mtime: int, df: pd.DataFrame):
+        with self._mem_lock:
+            self._mem[key] = (mtime, df)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.mem_entries:
+                self._mem.popitem(last=False)
+
+    def _write(self, symbol: str, interval: str, df: pd.DataFrame, meta: dict):
+        p = self.path(symbol, interval)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(f"{p.name}.{os.getpid()}.tmp")
+        df.to_parquet(tmp)
+        os.replace(tmp, p)
+        mp = self._meta_path(symbol, interval)
+        tmp = mp.with_name(f"{mp.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, mp)
+        self._remember((symbol, interval), p.stat().st_mtime_ns, df)
+
+    # ----- fetching -----
+
+    def _download(self, symbol: str, interval: str, start=None, period: str | None = None) -> pd.DataFrame:
+        return _normalize(self.provider.download(symbol, interval=interval, start=start, period=period))
+
+    def ingest(self, symbol: str, interval: str, new: pd.DataFrame, period: str | None = None) -> pd.DataFrame:
+        """
+        Merge ``new`` bars into the partition (newer rows win) and persist it.
+        Pass the ``period`` they were downloaded for when they are a full history
+        rather than an incremental top-up.
+        """
+        symbol = symbol.upper().strip()
+        covered_from = start = None
+        if period is not None:
+            start = _period_start(period)
+            covered_from = "max" if start is None else start.date().isoformat()
+        new = _normalize(new)
+        with self._lock((symbol, interval)):
+            old = self._read(symbol, interval)
+            if period is None and self._adjusted_since(old, new):
+                # a top-up that overlaps stored bars shows the provider re-adjusted the history
+                full = self._refetch_readjusted(symbol, interval)
+                if full.empty:
+                    raise ValueError("Stored history was re-adjusted upstream and the full refetch returned no data")
+                return self._merge(symbol, interval, _normalize(None), full, None)
+            return self._merge(symbol, interval, old, new, covered_from, keep_from=start)
+
+    def partition(self, symbol: str, interval: str = "1d") -> pd.DataFrame:
+        """Everything stored for ``symbol`` without touching the provider (shared; do not mutate)."""
+        symbol = symbol.upper().strip()
+        with self._lock((symbol, interval)):
+            return self._read(symbol, interval)
+
+    def refresh(self, symbol: str, interval: str = "1d", start=None) -> pd.DataFrame:
+        """Bring the partition up to date from ``start`` like ``get`` and return all of it (shared; do not mutate)."""
+        symbol = symbol.upper().strip()
+        need_from = pd.Timestamp(start).tz_localize(None).normalize() if start is not None else None
+        with self._lock((symbol, interval)):
+            return self._refresh(symbol, interval, need_from, None, True)
+
+    def covers(self, symbol: str, interval: str = "1d", period: str = "max") -> bool:
+        """Whether the stored history was downloaded over at least ``period``."""
+        meta = self.freshness(symbol.upper().strip(), interval) or {}
+        return bool(meta.get("rows")) and _covers(meta.get("coveredFrom"), _period_start(period))
+
+    def last_bar(self, symbol: str, interval: str = "1d") -> pd.Timestamp | None:
+        meta = self.freshness(symbol, interval)
+        return pd.Timestamp(meta["last"]) if meta and meta.get("last") else None
+
+    def _merge(self, symbol, interval, old: pd.DataFrame, new: pd.DataFrame, covered_from: str | None,
+               keep_from: pd.Timestamp | None = None) -> pd.DataFrame:
+        df = _normalize(pd.concat([old, new])) if len(old) else new
+        meta = self.freshness(symbol, interval) or {}
+        meta.pop("ageSeconds", None)
+        if covered_from is not None:
+            prev = meta.get("coveredFrom")
+            if covered_from == "max" or prev == "max":
+                meta["coveredFrom"] = "max"
+            else:
+                meta["coveredFrom"] = min(filter(None, [prev, covered_from]))
+        if _is_intraday(interval):
+            df = self._prune(df, meta, keep_from)
+        meta.update({
+            "symbol": symbol,
+            "interval": interval,
+            "rows": int(len(df)),
+            "first": df.index[0].isoformat() if len(df) else None,
+            "last": df.index[-1].isoformat() if len(df) else None,
+            "fetchedAt": time.time(),
+        })
+        self._write(symbol, interval, df, meta)
+        return df
+
+    def _prune(self, df: pd.DataFrame, meta: dict, keep_from: pd.Timestamp | None) -> pd.DataFrame:
+        """Drop intraday bars older than the widest window requested so far."""
+        now = pd.Timestamp.utcnow().tz_localize(None).normalize()
+        days = (now - keep_from).days + 1 if keep_from is not None else PRICE_INTRADAY_KEEP_DAYS
+        meta["keepDays"] = days = max(days, int(meta.get("keepDays", 0)))
+        cutoff = now - pd.Timedelta(days=days)
+        if len(df):
+            df = df[df.index >= _like(cutoff, df.index)]
+        covered = meta.get("coveredFrom")
+        if covered is not None and (covered == "max" or covered < cutoff.date().isoformat()):
+            meta["coveredFrom"] = cutoff.date().isoformat()
+        return df
+
+    def _adjusted_since(self, old: pd.DataFrame, new: pd.DataFrame) -> bool:
+        """True if a re-downloaded completed bar no longer matches the stored one (split/dividend re-adjustment)."""
+        both = old.index[:-1].intersection(new.index)
+        if not len(both):
+            return False
+        a = old.loc[both, "Close"].to_numpy("float64")
+        b = new.loc[both, "Close"].to_numpy("float64")
+        return not np.allclose(a, b, rtol=PRICE_ADJUST_RTOL, atol=0.0)
+
+    def _refetch_readjusted(self, symbol: str, interval: str) -> pd.DataFrame:
+        """Download the whole stored range again after ``_adjusted_since`` found a changed bar."""
+        logger.info("Stored %s %s bars were re-adjusted upstream, refetching full history", symbol, interval)
+        covered = (self.freshness(symbol, interval) or {}).get("coveredFrom")
+        full = self._download(symbol, interval, start=None if covered in (None, "max") else covered,
+                              period="max" if covered in (None, "max") else None)
+        if not full.empty:
+            self.full += 1
+            self.readjusted += 1
+        return full
+
+    def _max_age(self, interval: str) -> float:
+        return PRICE_INTRADAY_MAX_AGE_S if _is_intraday(interval) else PRICE_MAX_AGE_S
+
+    def _refresh(self, symbol: str, interval: str, need_from: pd.Timestamp | None, period: str | None, refresh: bool) -> pd.DataFrame:
+        df = self._read(symbol, interval)
+        meta = self.freshness(symbol, interval) or {}
+        covered = meta.get("coveredFrom")
+        need_key = "max" if need_from is None else need_from.date().isoformat()
+
+        if not len(df) or not _covers(covered, need_from):
+            new = self._download(symbol, interval, start=None if period else need_from, period=period)
+            self.full += 1
+            if new.empty and not len(df):
+                return df
+            return self._merge(symbol, interval, df, new, need_key, keep_from=need_from)
+
+        if refresh and meta.get("ageSeconds", float("inf")) > self._max_age(interval):
+            # refetch from the last completed bar: the partial last bar gets replaced and
+            # the completed one tells us whether the provider re-adjusted the history
+            anchor = df.index[-2] if len(df) > 1 else df.index[-1]
+            try:
+                new = self._download(symbol, interval, start=anchor.tz_localize(None).date().isoformat())
+            except Exception as e:
+                logger.warning("Incremental fetch failed for %s %s, serving stored bars: %s", symbol, interval, e)
+                return df
+            if self._adjusted_since(df, new):
+                full = self._refetch_readjusted(symbol, interval)
+                if full.empty:
+                    return df
+                # replace, not merge: none of the old bars are on the new price basis
+                return self._merge(symbol, interval, _normalize(None), full, None)
+            self.incremental += 1
+            return self._merge(symbol, interval, df, new, None)
+
+        self.local_hits += 1
+        return df
+
+    # ----- public API -----
+
+    def get(self, symbol: str, interval: str = "1d", start=None, end=None,
+            period: str | None = None, refresh: bool = True) -> pd.DataFrame:
+        """
+        Bars for ``symbol`` between ``start`` (inclusive) and ``end`` (exclusive),
+        or over a yfinance-style ``period``. Only missing bars are downloaded.
+        """
+        symbol = symbol.upper().strip()
+        if start is not None:
+            need_from = pd.Timestamp(start).tz_localize(None).normalize()
+        elif period is not None:
+            need_from = _period_start(period)
+        else:
+            need_from = None
+        with self._lock((symbol, interval)):
+            df = self._refresh(symbol, interval, need_from, period, refresh)
+        if df.empty:
+            return df.copy()
+        if start is not None:
+            df = df[df.index >= _like(start, df.index)]
+        elif period is not None:
+            df = _slice_period(df, period)
+        if end is not None:
+            df = df[df.index < _like(end, df.index)]
+        return df.copy()
+
+    def stats(self) -> dict:
+        return {
+            "root": str(self.root),
+            "provider": self.provider.name,
+            "localHits": self.local_hits,
+            "incrementalFetches": self.incremental,
+            "fullFetches": self.full,
+            "readjusted": self.readjusted,
+            "inMemory": len(self._mem),
+        }
+
+
+price_store = PriceStore()
@@ -0,0 +1,298 @@
+# app/services/retrain.py
+"""Background folding of new symbols into the global LSTM.
+
+Forecast requests for a ticker the global model has not been trained on no
+longer retrain inline: they are answered by the current model plus the
+per-ticker calibrator fitted on the backtest slice, and the ticker is queued
+here. A daemon thread waits for the queue to settle, then fine-tunes the
+existing models on the new symbols (plus a replay sample of already-trained
+ones so the rest of the universe is not forgotten) and publishes the new
+artifacts through the model registry in one swap.
+
+Only symbols that produced training windows are recorded as trained. A
+symbol that fails (or yields no windows) ``RETRAIN_MAX_ATTEMPTS`` times is
+moved to ``retrain_failed.json`` and not queued again.
+
+Every API worker runs a scheduler, so the queue, the failed list and the
+trained set live in files that are read, changed and written back under one
+file lock; no process overwrites another's additions with its own view. When
+there are no global artifacts at all, the first forecast asks the scheduler
+for a full training run instead of training on the request thread.
+"""
+from __future__ import annotations
+
+import os
+import json
+import time
+import random
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import tensorflow as tf
+from joblib import load
+
+try:  # advisory cross-process lock; not available on Windows
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+from app.core.config import logger
+from app.services import global_model as gm
+from app.services.model_registry import registry
+
+RETRAIN_ENABLED = os.getenv("RETRAIN_ENABLED", "1") == "1"
+RETRAIN_DEBOUNCE_S = float(os.getenv("RETRAIN_DEBOUNCE_S", "300"))   # wait for more symbols before training
+RETRAIN_MAX_BATCH = int(os.getenv("RETRAIN_MAX_BATCH", "50"))
+RETRAIN_REPLAY = int(os.getenv("RETRAIN_REPLAY", "40"))              # trained symbols mixed in per run
+RETRAIN_EPOCHS = int(os.getenv("RETRAIN_EPOCHS", "3"))
+RETRAIN_MAX_ATTEMPTS = int(os.getenv("RETRAIN_MAX_ATTEMPTS", "3"))
+
+QUEUE_PATH = gm.ARTIFACTS_DIR / "retrain_queue.json"
+FAILED_PATH = gm.ARTIFACTS_DIR / "retrain_failed.json"   # symbol -> last error, never requeued
+STAGING_DIR = gm.ARTIFACTS_DIR / ".staging"
+LOCK_PATH = gm.ARTIFACTS_DIR / "retrain.lock"            # guards the files above and the trained set
+INITIAL_LOCK_PATH = gm.ARTIFACTS_DIR / "initial_train.lock"
+
+
+def _write_atomic(path: Path, text: str):
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+@contextmanager
+def _file_lock(path: Path = LOCK_PATH, blocking: bool = True):
+    """Exclusive flock on ``path``; yields False if ``blocking`` is off and another process holds it."""
+    if fcntl is None:
+        yield True
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+class RetrainScheduler:
+    def __init__(self, interval: str = "1d"):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending: dict[str, float] = self._load_queue()
+        self._attempts: dict[str, int] = {}
+        self.failed: dict[str, str] = self._load_failed()
+        self._thread: threading.Thread | None = None
+        self._initial: threading.Thread | None = None
+        self.running: list[str] = []
+        self.runs = 0
+        self.last_run: dict | None = None
+
+    # ----- queue -----
+
+    def _load_queue(self) -> dict[str, float]:
+        try:
+            return {s: float(t) for s, t in json.loads(QUEUE_PATH.read_text()).items()}
+        except Exception:
+            return {}
+
+    def _save_queue(self):
+        QUEUE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(QUEUE_PATH, json.dumps(self._pending))
+
+    def _load_failed(self) -> dict[str, str]:
+        try:
+            return {str(k): str(v) for k, v in json.loads(FAILED_PATH.read_text()).items()}
+        except Exception:
+            return {}
+
+    def _save_failed(self):
+        FAILED_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(FAILED_PATH, json.dumps(self.failed, indent=2))
+
+    def _sync(self):
+        """Catch up with the other processes' changes. Caller holds both locks."""
+        self._pending = self._load_queue()
+        self.failed = self._load_failed()
+
+    def _retry_or_drop(self, symbols: list[str], reason: str):
+        """Requeue symbols that weren't folded in; past RETRAIN_MAX_ATTEMPTS they're dead-lettered. Caller holds the lock."""
+        dropped = []
+        with _file_lock():
+            self._sync()
+            for s in symbols:
+                n = self._attempts.get(s, 0) + 1
+                if n >= RETRAIN_MAX_ATTEMPTS:
+                    self._attempts.pop(s, None)
+                    self.failed[s] = reason
+                    dropped.append(s)
+                else:
+                    self._attempts[s] = n
+                    self._pending.setdefault(s, time.time())
+            self._save_queue()
+            if dropped:
+                self._save_failed()
+        if dropped:
+            logger.warning("Giving up on retraining %s after %d attempts: %s", dropped, RETRAIN_MAX_ATTEMPTS, reason)
+
+    def enqueue(self, symbol: str) -> bool:
+        s = symbol.upper().strip()
+        with self._lock:
+            if s in self._pending or s in self.running or s in self.failed:
+                return False
+            with _file_lock():
+                self._sync()
+                if s in self._pending or s in self.failed:
+                    return False
+                self._pending[s] = time.time()
+                self._save_queue()
+        logger.info("Queued %s for background global retrain", s)
+        self._wake.set()
+        return True
+
+    def _take_batch(self) -> list[str]:
+        with self._lock, _file_lock():
+            self._sync()
+            if not self._pending:
+                return []
+            if time.time() - max(self._pending.values()) < RETRAIN_DEBOUNCE_S and len(self._pending) < RETRAIN_MAX_BATCH:
+                return []
+            batch = sorted(self._pending, key=self._pending.get)[:RETRAIN_MAX_BATCH]
+            for s in batch:
+                self._pending.pop(s)
+            self._save_queue()
+            self.running = batch
+            return batch
+
+    # ----- initial training -----
+
+    def request_initial(self, look_back: int, horizon: int) -> bool:
+        """
+        Train the global model from scratch on a background thread; False if
+        retraining is disabled. Only one process trains: the others find the
+        lock taken and leave it to that one.
+        """
+        if not RETRAIN_ENABLED:
+            return False
+        with self._lock:
+            if self._initial is None or not self._initial.is_alive():
+                self._initial = threading.Thread(target=self._train_initial, args=(look_back, horizon),
+                                                 name="global-initial-train", daemon=True)
+                self._initial.start()
+        return True
+
+    def _train_initial(self, look_back: int, horizon: int):
+        with _file_lock(INITIAL_LOCK_PATH, blocking=False) as owner:
+            if not owner:
+                return
+            t0 = time.time()
+            try:
+                gm.ensure_global_trained(look_back, horizon, interval=self.interval)
+                self.last_run = {"initial": True, "ok": True, "seconds": round(time.time() - t0, 1), "at": t0}
+            except Exception as e:
+                logger.exception("Initial global training failed")
+                self.last_run = {"initial": True, "ok": False, "error": str(e), "at": t0}
+
+    # ----- worker -----
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="global-retrain", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            self._wake.wait(timeout=min(RETRAIN_DEBOUNCE_S, 60.0))
+            self._wake.clear()
+            batch = self._take_batch()
+            if batch:
+                self.run_batch(batch)
+
+    def run_batch(self, symbols: list[str]):
+        t0 = time.time()
+        try:
+            folded = self._retrain(symbols)
+            skipped = [s for s in symbols if s not in folded]
+            self.last_run = {"symbols": folded, "skipped": skipped, "ok": True,
+                             "seconds": round(time.time() - t0, 1), "at": t0}
+            with self._lock:
+                for s in folded:
+                    self._attempts.pop(s, None)
+                if skipped:
+                    self._retry_or_drop(skipped, "no training windows")
+        except Exception as e:
+            logger.exception("Background retrain failed for %s", symbols)
+            self.last_run = {"symbols": symbols, "ok": False, "error": str(e), "at": t0}
+            with self._lock:
+                self._retry_or_drop(symbols, str(e))
+        finally:
+            self.runs += 1
+            with self._lock:
+                self.running = []
+
+    def _retrain(self, symbols: list[str]) -> list[str]:
+        """Fine-tune on ``symbols`` (plus replay); returns the ones that were folded in."""
+        m_multi = tf.keras.models.load_model(gm.GLOBAL_MODEL_M)
+        m_one = tf.keras.models.load_model(gm.GLOBAL_MODEL_1)
+        scaler_X = load(gm.GLOBAL_SCALER_X)
+        look_back = int(m_multi.inputs[0].shape[1])
+        horizon = int(m_multi.outputs[0].shape[-1])
+
+        try:
+            trained = json.loads(gm.TRAINED_SET_PATH.read_text())
+        except Exception:
+            trained = []
+        replay = random.sample(trained, min(RETRAIN_REPLAY, len(trained)))
+        X, Y, S, used = gm._build_dataset_for_universe(symbols + replay, look_back, horizon, interval=self.interval)
+        folded = [s for s in symbols if s in set(used)]
+        if not folded:
+            logger.warning("No training windows for %s; global model left unchanged", symbols)
+            return []
+        Xs = gm._apply_scaler_global(X, scaler_X)
+
+        # Fine-tune from the current weights; the scalers stay fixed so old and new
+        # symbols share one input space.
+        m_multi.fit({"ts_in": Xs, "sid_in": S}, Y, epochs=RETRAIN_EPOCHS, batch_size=256, verbose=0)
+        m_one.fit({"ts_in": Xs, "sid_in": S}, Y[:, :1], epochs=RETRAIN_EPOCHS, batch_size=256, verbose=0)
+
+        STAGING_DIR.mkdir(parents=True, exist_ok=True)
+        staged_multi = STAGING_DIR / gm.GLOBAL_MODEL_M.name
+        staged_one = STAGING_DIR / gm.GLOBAL_MODEL_1.name
+        m_multi.save(staged_multi)
+        m_one.save(staged_one)
+        registry.publish({staged_multi: gm.GLOBAL_MODEL_M, staged_one: gm.GLOBAL_MODEL_1})
+
+        with _file_lock():
+            try:   # re-read: another process may have folded symbols in meanwhile
+                trained = json.loads(gm.TRAINED_SET_PATH.read_text())
+            except Exception:
+                pass
+            _write_atomic(gm.TRAINED_SET_PATH, json.dumps(sorted(set(trained) | set(folded)), indent=2))
+            for s in folded:
+                gm.add_symbol_to_universe_file(s)
+        logger.info("Folded %d new symbols into the global model (%d windows)", len(folded), len(Xs))
+        return folded
+
+    def stats(self) -> dict:
+        with self._lock:
+            with _file_lock():
+                self._sync()
+            return {
+                "enabled": RETRAIN_ENABLED,
+                "pending": sorted(self._pending),
+                "running": list(self.running),
+                "retrying": dict(self._attempts),
+                "failed": sorted(self.failed),
+                "initialTraining": bool(self._initial and self._initial.is_alive()),
+                "runs": self.runs,
+                "lastRun": self.last_run,
+            }
+
+
+retrain_scheduler = RetrainScheduler()
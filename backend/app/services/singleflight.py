@@ -0,0 +1,41 @@
+# app/services/singleflight.py
+"""Coalesce identical in-flight computations onto one shared future."""
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._inflight: Dict[Hashable, Future] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def join(self, key: Hashable, start: Callable[[], Future]) -> Future:
+        """
+        Return the future already computing ``key``, or call ``start`` to begin
+        it. Every caller with the same key gets the same future, and the key is
+        released as soon as it resolves so later calls recompute.
+        """
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                self.coalesced += 1
+                return fut
+            fut = start()
+            self._inflight[key] = fut
+            self.started += 1
+        fut.add_done_callback(lambda f: self._forget(key, f))
+        return fut
+
+    def _forget(self, key: Hashable, fut: Future):
+        with self._lock:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"inflight": len(self._inflight), "started": self.started, "coalesced": self.coalesced}
@@ -0,0 +1,257 @@
+# app/services/symbol_index.py
+"""Symbol <-> embedding-id registry backed by ``symbol_index.json``.
+
+Lookups are a dict hit (symbol -> id) or a list index (id -> symbol). New
+ids come from a LIFO free list of released/unused slots or the high-water
+mark, so allocation is O(1) instead of scanning for the next unused integer.
+An id is allocated under an advisory file lock, after re-reading the file
+if another process changed it, and is written (atomic rename) before the
+lock is dropped. Ids are therefore never handed out twice and never change
+once returned. ``batch()`` keeps the lock across many new symbols and
+writes once at the end.
+
+A released id carries state keyed by it elsewhere: release hooks (see
+``on_release``) reset it, e.g. the calibrator row. A trained embedding row
+can't be reset, so ``release(..., retire=True)`` keeps the id out of reuse
+until ``clear_retired()`` (after the global model is retrained from scratch).
+
+The on-disk format is unchanged (``{"symbol_to_id": ..., "id_to_symbol": ...}``,
+plus ``"retired"`` when any id is retired) so the notebook,
+``manage_global_lstm.py`` and the API keep sharing one file.
+Kept free of app imports so the CLI can use it without loading the web stack.
+"""
+from __future__ import annotations
+
+import os
+import json
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+try:  # advisory cross-process lock; not available on Windows
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+logger = logging.getLogger("stock-predictor")
+
+
+class SymbolIndex:
+    def __init__(self, path: Path | str, max_symbols: int):
+        self.path = Path(path)
+        self.max_symbols = max_symbols
+        self._lock = threading.RLock()
+        self._to_id: Dict[str, int] = {}
+        self._to_sym: List[Optional[str]] = []
+        self._free: List[int] = []        # stack of unused ids below the high-water mark, smallest on top after a load
+        self._retired: Set[int] = set()   # released ids whose trained embedding row must not be inherited
+        self._hooks: List[Callable[[int], None]] = []
+        self._pending = 0
+        self._batch_depth = 0
+        self._held = False                # file lock taken (kept until the outermost batch ends)
+        self._lock_fh = None
+        self._mtime = -1
+        self.reload()
+        atexit.register(self.flush)
+
+    # ----- load / persist -----
+
+    def _file_mtime(self) -> int:
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _read(self) -> Tuple[Dict[str, int], Set[int]]:
+        try:
+            raw = json.loads(self.path.read_text())
+            return ({str(s).upper(): int(i) for s, i in raw.get("symbol_to_id", {}).items()},
+                    {int(i) for i in raw.get("retired", [])})
+        except FileNotFoundError:
+            return {}, set()
+        except Exception as e:
+            logger.warning("Ignoring unreadable symbol index %s: %s", self.path, e)
+            return {}, set()
+
+    def _rebuild(self, mapping: Dict[str, int], retired: Set[int]):
+        self._to_id = dict(mapping)
+        top = max([*mapping.values(), *retired], default=-1)
+        self._to_sym = [None] * (top + 1)
+        for s, i in mapping.items():
+            self._to_sym[i] = s
+        self._retired = {i for i in retired if self._to_sym[i] is None}
+        self._free = [i for i in range(top, -1, -1) if self._to_sym[i] is None and i not in self._retired]
+
+    def reload(self):
+        with self._lock:
+            self._rebuild(*self._read())
+            self._mtime = self._file_mtime()
+            self._pending = 0
+
+    def reload_if_changed(self):
+        """Pick up ids other processes have claimed."""
+        if self._file_mtime() == self._mtime:
+            return
+        with self._lock:
+            if not self._held:
+                self.reload()
+
+    def _acquire(self):
+        """
+        Take the file lock and catch up with the file before changing anything,
+        so every id handed out is one no other process has claimed. Inside
+        ``batch()`` the lock is kept until the outermost batch ends.
+        """
+        if self._held:
+            return
+        if fcntl is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._lock_fh = open(self.path.with_name(self.path.name + ".lock"), "w")
+            fcntl.flock(self._lock_fh, fcntl.LOCK_EX)
+        self._held = True
+        if self._file_mtime() != self._mtime:
+            self.reload()
+
+    def _release(self):
+        """Write pending changes and drop the file lock, unless a batch is still open."""
+        if not self._held or self._batch_depth:
+            return
+        try:
+            self.flush()
+        finally:
+            if self._lock_fh is not None:
+                fcntl.flock(self._lock_fh, fcntl.LOCK_UN)
+                self._lock_fh.close()
+                self._lock_fh = None
+            self._held = False
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            payload = {
+                "symbol_to_id": self._to_id,
+                "id_to_symbol": {str(i): s for i, s in enumerate(self._to_sym) if s is not None},
+            }
+            if self._retired:
+                payload["retired"] = sorted(self._retired)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(payload, separators=(",", ":")))
+            os.replace(tmp, self.path)
+            self._mtime = self._file_mtime()
+            self._pending = 0
+
+    @contextmanager
+    def batch(self):
+        """Claim ids under one file lock and write them once when the outermost ``batch()`` exits."""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                self._release()
+
+    @contextmanager
+    def locked(self):
+        """Hold the file lock for the whole block; files kept alongside the index are created under it too."""
+        with self.batch():
+            with self._lock:
+                self._acquire()
+            yield self
+
+    # ----- allocation -----
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        nxt = len(self._to_sym)
+        if nxt >= self.max_symbols:
+            raise RuntimeError("Increase MAX_SYMBOLS")
+        self._to_sym.append(None)
+        return nxt
+
+    def ensure(self, symbol: str) -> int:
+        s = symbol.upper().strip()
+        sid = self._to_id.get(s)
+        if sid is not None:
+            return sid
+        with self._lock:
+            self._acquire()
+            try:
+                sid = self._to_id.get(s)   # another process may have added it
+                if sid is None:
+                    sid = self._allocate()
+                    self._to_sym[sid] = s
+                    self._to_id[s] = sid
+                    self._pending += 1
+            finally:
+                self._release()
+            return sid
+
+    def ensure_many(self, symbols: Iterable[str]) -> Dict[str, int]:
+        with self.batch():
+            return {s.upper().strip(): self.ensure(s) for s in symbols}
+
+    def on_release(self, hook: Callable[[int], None]):
+        """Call ``hook(sid)`` whenever an id is released, before it can be handed to another symbol."""
+        self._hooks.append(hook)
+
+    def release(self, symbol: str, retire: bool = False) -> bool:
+        """
+        Drop ``symbol``. Its id goes back on the free list, or with ``retire``
+        (its embedding row was trained) is held back until ``clear_retired()``.
+        """
+        with self._lock:
+            self._acquire()
+            try:
+                sid = self._to_id.pop(symbol.upper().strip(), None)
+                if sid is None:
+                    return False
+                self._to_sym[sid] = None
+                for hook in self._hooks:
+                    hook(sid)
+                if retire:
+                    self._retired.add(sid)
+                else:
+                    self._free.append(sid)
+                self._pending += 1
+                return True
+            finally:
+                self._release()
+
+    def clear_retired(self):
+        """Make retired ids reusable again; call once no trained weights refer to them."""
+        with self._lock:
+            if not self._retired and self._file_mtime() == self._mtime:
+                return
+            self._acquire()
+            try:
+                if self._retired:
+                    self._free.extend(sorted(self._retired, reverse=True))
+                    self._retired.clear()
+                    self._pending += 1
+            finally:
+                self._release()
+
+    # ----- lookups -----
+
+    def get(self, symbol: str) -> Optional[int]:
+        return self._to_id.get(symbol.upper().strip())
+
+    def symbol(self, sid: int) -> Optional[str]:
+        return self._to_sym[sid] if 0 <= sid < len(self._to_sym) else None
+
+    def symbols(self) -> List[str]:
+        return sorted(self._to_id)
+
+    def __contains__(self, symbol: object) -> bool:
+        return isinstance(symbol, str) and symbol.upper().strip() in self._to_id
+
+    def __len__(self) -> int:
+        return len(self._to_id)
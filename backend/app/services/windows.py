@@ -0,0 +1,58 @@
+# app/services/windows.py
+"""Sliding windows as strided views instead of per-window copies.
+
+``numpy.lib.stride_tricks.sliding_window_view`` exposes every window of a
+``(T, F)`` array without copying it. The views are read-only. Callers that
+need a contiguous batch (Keras, scalers) copy once at that point. Horizon
+target sums come from a prefix sum, so each one is O(1) instead of O(H).
+"""
+from __future__ import annotations
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def window_view(a: np.ndarray, lookback: int) -> np.ndarray:
+    """
+    All ``lookback``-long windows of ``a`` along axis 0, as a read-only view.
+    ``(T, F) -> (T-lookback+1, lookback, F)`` and ``(T,) -> (T-lookback+1, lookback)``.
+    """
+    if len(a) < lookback:
+        return np.empty((0, lookback) + a.shape[1:], dtype=a.dtype)
+    v = sliding_window_view(a, lookback, axis=0)      # window axis is appended last
+    return np.moveaxis(v, -1, 1) if a.ndim > 1 else v
+
+
+def make_windows(X: np.ndarray, y: np.ndarray, lookback: int, horizon: int):
+    """
+    Inputs ``X[i-lookback:i]`` and multi-step targets ``y[i:i+horizon]`` for every
+    ``i`` in ``[lookback, len(X)-horizon]``, both float32 views.
+    """
+    X = np.asarray(X, dtype="float32")
+    y = np.asarray(y, dtype="float32")
+    n = len(X) - horizon + 1 - lookback
+    if n <= 0:
+        return (np.empty((0, lookback) + X.shape[1:], dtype="float32"),
+                np.empty((0, horizon), dtype="float32"))
+    return window_view(X, lookback)[:n], window_view(y, horizon)[lookback:lookback + n]
+
+
+def horizon_sums(y: np.ndarray, lookback: int, horizon: int) -> np.ndarray:
+    """``sum(y[i:i+horizon])`` for every window start ``i`` in ``[lookback, len(y)-horizon]``."""
+    c = np.concatenate([[0.0], np.cumsum(np.asarray(y, dtype="float64"))])
+    i = np.arange(lookback, len(y) - horizon + 1)
+    return (c[i + horizon] - c[i]).astype("float32")
+
+
+def slice_windows(X: np.ndarray, y: np.ndarray, lookback: int, horizon: int):
+    """Inputs ``X[i-lookback:i]`` with the cumulative ``horizon`` target starting at ``i``."""
+    X = np.asarray(X, dtype="float32")
+    n = len(X) - horizon + 1 - lookback
+    if n <= 0:
+        return np.empty((0, lookback) + X.shape[1:], dtype="float32"), np.empty((0,), dtype="float32")
+    return window_view(X, lookback)[:n], horizon_sums(y, lookback, horizon)
+
+
+def windows_ending_at(X: np.ndarray, ends: np.ndarray, lookback: int) -> np.ndarray:
+    """Windows ``X[e-lookback:e]`` for each ``e`` in ``ends`` (a gather, so this one copies)."""
+    return window_view(X, lookback)[np.asarray(ends) - lookback]
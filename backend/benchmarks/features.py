@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Parity + speed check: panel features (app/services/features.py) vs the per-symbol pandas versions.
+
+Run from backend/:
+
+    python -m benchmarks.features --symbols 500 --rows 2500
+
+Exits non-zero if any feature differs from the legacy pandas code beyond
+float tolerance.
+"""
+import argparse, statistics, sys, time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.features import add_features_many, make_features_many, iter_features, FEATURES, FEATS, TARGET
+
+
+def legacy_add_features(df):
+    out = df.copy()
+    close = pd.to_numeric(out["Close"].squeeze(), errors="coerce")
+    close = close.where(close > 0, np.nan)
+    out["Close"] = close
+    out["log_ret"] = np.log(close).diff()
+    out["ret"] = close.pct_change()
+    out["roll_mean_7"] = close.rolling(7).mean()
+    out["roll_std_7"] = close.rolling(7).std()
+    out["roll_mean_21"] = close.rolling(21).mean()
+    out["roll_std_21"] = close.rolling(21).std()
+    delta = close.diff()
+    up = delta.clip(lower=0)
+    down = -delta.clip(upper=0)
+    roll_up = up.ewm(alpha=1 / 14, min_periods=14, adjust=False).mean()
+    roll_dn = down.ewm(alpha=1 / 14, min_periods=14, adjust=False).mean()
+    rs = roll_up / roll_dn.replace(0, np.nan)
+    out["rsi_14"] = 100 - (100 / (1 + rs))
+    ema12 = close.ewm(span=12, adjust=False).mean()
+    ema26 = close.ewm(span=26, adjust=False).mean()
+    macd = ema12 - ema26
+    out["macd"] = macd
+    out["macd_signal"] = macd.ewm(span=9, adjust=False).mean()
+    out["macd_diff"] = out["macd"] - out["macd_signal"]
+    ma20 = close.rolling(20).mean()
+    sd20 = close.rolling(20).std()
+    out["bb_width"] = (ma20 + 2 * sd20 - (ma20 - 2 * sd20)) / close
+    out["ret_lag1"] = out["log_ret"].shift(1)
+    out["ret_lag3"] = out["log_ret"].shift(3)
+    out["ret_lag5"] = out["log_ret"].shift(5)
+    out["vol_7"] = out["log_ret"].rolling(7).std()
+    out["vol_21"] = out["log_ret"].rolling(21).std()
+    out["z_close_21"] = (close - close.rolling(21).mean()) / close.rolling(21).std()
+    return out.dropna()
+
+
+def legacy_make_features(df):
+    out = pd.DataFrame(index=df.index)
+    c = df["Close"]
+    v = df["Volume"].fillna(0.0)
+    d = c.diff(); up = d.clip(lower=0); dn = -1 * d.clip(upper=0)
+    ma_u = up.ewm(com=13, adjust=False).mean(); ma_d = dn.ewm(com=13, adjust=False).mean()
+    rsi = 100 - (100 / (1 + ma_u / (ma_d + 1e-9)))
+    ef = c.ewm(span=12, adjust=False).mean(); es = c.ewm(span=26, adjust=False).mean()
+    m = ef - es; s = m.ewm(span=9, adjust=False).mean()
+    ma = c.rolling(20).mean(); sd = c.rolling(20).std(ddof=0)
+    out["ret1"] = c.pct_change().fillna(0)
+    out["ret5"] = c.pct_change(5).fillna(0)
+    out["rsi14"] = rsi.fillna(50) / 100
+    out["macd"] = m.fillna(0); out["macd_sig"] = s.fillna(0)
+    out["bbp"] = ((c - (ma - 2 * sd)) / ((ma + 2 * sd) - (ma - 2 * sd) + 1e-9)).fillna(0.5)
+    logv = np.log1p(v); out["vol_z"] = (logv - logv.rolling(20).mean()) / (logv.rolling(20).std(ddof=0) + 1e-9)
+    out["vol_z"] = out["vol_z"].replace([np.inf, -np.inf], 0).fillna(0)
+    out[TARGET] = out["ret1"].shift(-1).fillna(0)
+    return out
+
+
+def synthetic(n_symbols, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = {}
+    for j in range(n_symbols):
+        n = int(rng.integers(rows // 4, rows + 1))     # ragged histories exercise the padding
+        idx = pd.bdate_range(end="2024-12-31", periods=n)
+        close = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+        vol = rng.lognormal(13, 1, n)
+        vol[rng.random(n) < 0.01] = np.nan
+        frames[f"S{j:04d}"] = pd.DataFrame({"Open": close, "High": close * 1.01, "Low": close * 0.99,
+                                            "Close": close, "Volume": vol}, index=idx)
+    return frames
+
+
+def compare(name, legacy, new, rtol=1e-7, atol=1e-9):
+    worst, ok = 0.0, True
+    for sym, a in legacy.items():
+        b = new[sym]
+        if not a.index.equals(b.index) or list(a.columns) != list(b.columns):
+            print(f"FAIL {name} {sym}: index/columns differ ({len(a)} vs {len(b)} rows)")
+            return False
+        x, y = a.to_numpy("float64"), b.to_numpy("float64")
+        if not np.allclose(x, y, rtol=rtol, atol=atol, equal_nan=True):
+            print(f"FAIL {name} {sym}: max abs err {np.nanmax(np.abs(x - y)):.3e}")
+            ok = False
+        worst = max(worst, float(np.nanmax(np.abs(x - y) / (np.abs(x) + atol), initial=0.0)))
+    print(f"{'ok  ' if ok else 'FAIL'} {name:<14} symbols={len(legacy)}  max rel err={worst:.2e}")
+    return ok
+
+
+def bench(fn, runs):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter(); fn(); times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--symbols", type=int, default=500)
+    ap.add_argument("--rows", type=int, default=2500)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    frames = synthetic(args.symbols, args.rows)
+    ok = compare("add_features", {s: legacy_add_features(df) for s, df in frames.items()}, add_features_many(frames))
+    ok &= compare("make_features", {s: legacy_make_features(df) for s, df in frames.items()}, make_features_many(frames))
+
+    for name, old, new in [
+        ("add_features", lambda: [legacy_add_features(df) for df in frames.values()], lambda: add_features_many(frames)),
+        ("make_features", lambda: [legacy_make_features(df) for df in frames.values()], lambda: make_features_many(frames)),
+        # what the dataset builders consume: arrays, no per-symbol DataFrames
+        ("arrays/backtest", lambda: [legacy_add_features(df)[FEATURES].to_numpy() for df in frames.values()],
+         lambda: list(iter_features(frames, FEATURES, "backtest"))),
+        ("arrays/global", lambda: [legacy_make_features(df)[FEATS].to_numpy() for df in frames.values()],
+         lambda: list(iter_features(frames, FEATS, "global"))),
+    ]:
+        t_old, t_new = bench(old, args.runs), bench(new, args.runs)
+        print(f"{name:<16} per-symbol pandas={t_old:7.2f}s  panel={t_new:7.2f}s  speedup={t_old / t_new:5.1f}x")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Compare /forecast latency: papermill notebook run vs in-process engine.
+
+Run from backend/ so relative artifact paths resolve:
+
+    python -m benchmarks.forecast_latency --ticker AAPL --runs 5
+"""
+import argparse, json, os, statistics, sys, tempfile, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+NOTEBOOK_PATH = os.getenv("NOTEBOOK_PATH", "notebooks/Stock_LSTM_10day.ipynb")
+
+
+def run_notebook(ticker, look_back, context, backtest_horizon, horizon):
+    import papermill as pm
+    with tempfile.TemporaryDirectory() as tmp:
+        out_json = os.path.join(tmp, "forecast.json")
+        pm.execute_notebook(
+            NOTEBOOK_PATH, os.path.join(tmp, "out.ipynb"),
+            parameters={"TICKER": ticker, "LOOKBACK": look_back, "CONTEXT": context,
+                        "BACKTEST_HORIZON": backtest_horizon, "HORIZON": horizon, "OUTPUT_JSON": out_json},
+            kernel_name="python3", progress=False,
+        )
+        with open(out_json) as f:
+            return json.load(f)
+
+
+def run_engine(ticker, look_back, context, backtest_horizon, horizon):
+    from app.services.forecast import run_forecast
+    return run_forecast(ticker, look_back, context, backtest_horizon, horizon)
+
+
+def bench(fn, args, runs):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter(); fn(*args); times.append(time.perf_counter() - t0)
+    return times
+
+
+def summary(name, times):
+    print(f"{name:<12} runs={len(times)}  p50={statistics.median(times):7.2f}s  "
+          f"mean={statistics.mean(times):7.2f}s  min={min(times):7.2f}s  max={max(times):7.2f}s")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ticker", default="AAPL")
+    ap.add_argument("--look-back", type=int, default=60)
+    ap.add_argument("--context", type=int, default=100)
+    ap.add_argument("--backtest-horizon", type=int, default=20)
+    ap.add_argument("--horizon", type=int, default=10)
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--skip-notebook", action="store_true")
+    args = ap.parse_args()
+
+    params = (args.ticker.upper(), args.look_back, args.context, args.backtest_horizon, args.horizon)
+    # warm-up so both paths measure steady state (artifacts trained, data reachable)
+    run_engine(*params)
+    if not args.skip_notebook:
+        summary("papermill", bench(run_notebook, params, args.runs))
+    summary("in-process", bench(run_engine, params, args.runs))
+
+
+if __name__ == "__main__":
+    main()
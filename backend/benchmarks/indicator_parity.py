@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Parity + speed check: streaming indicator engines vs the batch pandas features.
+
+Run from backend/ (synthetic prices by default, or stored bars with --ticker):
+
+    python -m benchmarks.indicator_parity --rows 2500
+    python -m benchmarks.indicator_parity --ticker AAPL
+
+Exits non-zero if any streamed value differs from ``add_features`` /
+``make_features`` beyond float tolerance, including after incremental
+appends (read back as a ``--tail``) and a revised last bar.
+"""
+import argparse, sys, tempfile, time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.indicators import IndicatorStream, compute_features
+from app.services.price_store import PriceStore
+
+
+def synthetic(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, rows)))
+    idx = pd.bdate_range("2012-01-02", periods=rows, name="Date")
+    return pd.DataFrame({
+        "Open": close * (1 + rng.normal(0, 0.003, rows)),
+        "High": close * 1.01, "Low": close * 0.99, "Close": close,
+        "Volume": rng.integers(1_000, 1_000_000, rows).astype("float64"),
+    }, index=idx)
+
+
+def batch_reference(bars, kind):
+    from app.services.features import add_features, make_features
+    return add_features(bars) if kind == "backtest" else make_features(bars)
+
+
+def compare(name, got, want):
+    want = want[got.columns]
+    if not got.index.equals(want.index):
+        print(f"FAIL {name}: index differs ({len(got)} vs {len(want)} rows)")
+        return False
+    a, b = got.to_numpy("float64"), want.to_numpy("float64")
+    ok = np.allclose(a, b, rtol=1e-7, atol=1e-9, equal_nan=True)
+    err = np.nanmax(np.abs(a - b) / (np.abs(b) + 1e-9)) if a.size else 0.0
+    print(f"{'ok  ' if ok else 'FAIL'} {name:<34} rows={len(got):5d}  max rel err={err:.2e}")
+    return ok
+
+
+class _Offline:
+    name = "offline"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=2500)
+    ap.add_argument("--ticker")
+    ap.add_argument("--kinds", default="backtest,global")
+    ap.add_argument("--append", type=int, default=50, help="bars appended one at a time")
+    ap.add_argument("--tail", type=int, default=300, help="rows read back after each append")
+    args = ap.parse_args()
+
+    if args.ticker:
+        from app.services.price_store import price_store
+        bars = price_store.get(args.ticker, period="10y")
+    else:
+        bars = synthetic(args.rows)
+    ok = True
+
+    for kind in args.kinds.split(","):
+        batch_reference(bars, kind)   # warm-up
+        t0 = time.perf_counter(); want = batch_reference(bars, kind); t_batch = time.perf_counter() - t0
+        ok &= compare(f"{kind}: one shot", compute_features(bars, kind), want)
+
+        # incremental: checkpoint, then append bars one by one through a scratch store
+        with tempfile.TemporaryDirectory() as tmp:
+            store = PriceStore(Path(tmp), provider=_Offline())
+            stream = IndicatorStream(store)
+            head = len(bars) - args.append
+            store.ingest("SYN", "1d", bars.iloc[:head])
+            stream.features("SYN", "1d", kind)
+            t_incr = 0.0
+            for i in range(head, len(bars)):
+                store.ingest("SYN", "1d", bars.iloc[i:i + 1])
+                t0 = time.perf_counter()
+                got = stream.features("SYN", "1d", kind, tail=args.tail)
+                t_incr += (time.perf_counter() - t0) / max(1, args.append)
+            ok &= compare(f"{kind}: tail={args.tail} after appends", got, want.iloc[-len(got):])
+            ok &= compare(f"{kind}: after {args.append} appends", stream.features("SYN", "1d", kind), want)
+            t0 = time.perf_counter()
+            for _ in range(20):
+                stream.features("SYN", "1d", kind, tail=args.tail)
+            t_read = (time.perf_counter() - t0) / 20
+
+            # revise the last bar (a partial bar being finalized)
+            revised = bars.copy()
+            revised.iloc[-1, revised.columns.get_loc("Close")] *= 1.01
+            store.ingest("SYN", "1d", revised.iloc[-1:])
+            ok &= compare(f"{kind}: revised last bar", stream.features("SYN", "1d", kind), batch_reference(revised, kind))
+            print(f"     {kind}: batch recompute {t_batch * 1e3:.1f}ms, incremental update {t_incr * 1e3:.1f}ms/bar "
+                  f"(includes checkpoint write), read with no new bar {t_read * 1e3:.1f}ms, tail={args.tail}  {stream.stats()}")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Cold vs warm-started vs process-pool walk-forward backtest (app/services/backtest.py).
+
+Run from backend/ (needs TensorFlow):
+
+    python -m benchmarks.walk_forward --rows 2520 --look-back 60 --horizon 5 --steps 20
+
+Trains each variant on the same synthetic ten-year series and prints the
+per-step training time, total time and the error of each against the actual
+closes. The parallel run starts the worker pool first, so its total does not
+include process start-up.
+"""
+import argparse, sys, time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services import backtest as bt
+from app.services.features import add_features, FEATURES
+
+
+def synthetic(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range(end="2024-12-31", periods=rows)
+    close = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, rows)))
+    raw = pd.DataFrame({"Open": close, "High": close * 1.01, "Low": close * 0.99,
+                        "Close": close, "Volume": rng.lognormal(13, 1, rows)}, index=idx)
+    df = add_features(raw)
+    df["target_ret"] = df["log_ret"].shift(-1)
+    return df.dropna()
+
+
+def run(name, df, starts, L, H):
+    X_all = df[FEATURES].to_numpy("float32")
+    y_all = df["target_ret"].to_numpy("float32")
+    t0 = time.perf_counter()
+    if name == "warm":
+        steps = bt._warm_steps(X_all, y_all, starts, L, H)
+    elif name == "parallel":
+        steps = list(bt.iter_parallel_steps(X_all, y_all, starts, L, H))
+    else:
+        steps = [bt._cold_step(X_all, y_all, s, L, H) for s in starts]
+    out = bt._backtest_output("SYN", df, L, H, steps, name, time.perf_counter() - t0)
+    per_step = [s["trainSeconds"] for s in out["steps"]]
+    print(f"{name:<5} total={out['timing']['totalSeconds']:7.1f}s  first step={per_step[0]:6.2f}s  "
+          f"median later step={np.median(per_step[1:]) if len(per_step) > 1 else 0:6.2f}s  "
+          f"rmse={out['metrics']['rmse']:.3f}  mape={out['metrics']['mape']:.2f}%")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=2520)          # ~10 years of daily bars
+    ap.add_argument("--look-back", type=int, default=60)
+    ap.add_argument("--horizon", type=int, default=5)
+    ap.add_argument("--steps", type=int, default=20)
+    ap.add_argument("--procs", type=int, default=bt.BACKTEST_PROCS, help="0 skips the parallel run")
+    args = ap.parse_args()
+
+    df = synthetic(args.rows)
+    L, H = args.look_back, args.horizon
+    # the tail of the series, so every step trains on years of history as in a long backtest
+    starts = bt._walk_forward_starts(len(df), L, H, max_steps=10**9)[-args.steps:]
+    print(f"rows={len(df)} L={L} H={H} steps={len(starts)} warm_epochs={bt.WARM_EPOCHS} replay={bt.WARM_REPLAY}")
+
+    cold = run("cold", df, starts, L, H)
+    warm = run("warm", df, starts, L, H)
+    print(f"warm:     speedup={cold['timing']['totalSeconds'] / warm['timing']['totalSeconds']:.1f}x  "
+          f"rmse ratio warm/cold={warm['metrics']['rmse'] / cold['metrics']['rmse']:.3f}")
+    if args.procs:
+        bt.BACKTEST_PROCS = args.procs
+        # one throwaway step per worker so process start-up stays out of the timing
+        X_all, y_all = df[FEATURES].to_numpy("float32"), df["target_ret"].to_numpy("float32")
+        list(bt.iter_parallel_steps(X_all, y_all, starts[:args.procs], L, H))
+        par = run("parallel", df, starts, L, H)
+        print(f"parallel: speedup={cold['timing']['totalSeconds'] / par['timing']['totalSeconds']:.1f}x "
+              f"on {args.procs} processes")
+
+
+if __name__ == "__main__":
+    main()
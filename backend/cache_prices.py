@@ -1,27 +1,153 @@
-import argparse, yfinance as yf
+"""
+Bulk-load OHLCV history into the local price store.
+
+    python cache_prices.py --tickers tickers_trainable.txt --period 10y
+
+Symbols are fetched in chunks with the price provider's multi-ticker
+download, several chunks at a time. Symbols already in the store are only topped up from
+shortly before their last bar (the overlap lets ``PriceStore.ingest`` spot a split or
+dividend re-adjustment and refetch the full history), provided their stored history reaches back as far as ``--period``;
+shorter ones are refetched in full. A manifest next to the store records each finished symbol and its
+last bar, so an interrupted run picks up where it stopped (``--fresh``
+ignores it).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import pandas as pd
+
+from app.services.price_provider import provider
+from app.services.price_store import price_store, PRICE_STORE_DIR
+
 ap = argparse.ArgumentParser()
 ap.add_argument("--tickers", required=True)
 ap.add_argument("--period", default="2y")
 ap.add_argument("--interval", default="1d")
-ap.add_argument("--fmt", choices=["parquet","csv"], default="parquet")
+ap.add_argument("--workers", type=int, default=4, help="chunks downloaded concurrently")
+ap.add_argument("--chunk", type=int, default=25, help="symbols per multi-ticker download")
+ap.add_argument("--max-age", type=float, default=6 * 3600, help="skip symbols finished this many seconds ago")
+ap.add_argument("--fresh", action="store_true", help="ignore the manifest from a previous run")
 args = ap.parse_args()
 
-DATA = Path("data"); DATA.mkdir(exist_ok=True)
-tickers = [l.strip() for l in open(args.tickers) if l.strip()]
+MANIFEST = PRICE_STORE_DIR / args.interval / "_manifest.json"
+OVERLAP_DAYS = 7   # top-ups re-download this much stored history (spans a weekend plus a holiday)
+_lock = threading.Lock()
+
+
+def load_manifest() -> dict:
+    if args.fresh or not MANIFEST.exists():
+        return {"done": {}, "failed": {}}
+    return json.loads(MANIFEST.read_text())
+
+
+def save_manifest(m: dict):
+    MANIFEST.parent.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST.with_name(MANIFEST.name + ".tmp")
+    tmp.write_text(json.dumps(m, indent=2))
+    os.replace(tmp, MANIFEST)
+
+
+def split_frames(raw: pd.DataFrame, symbols: list) -> dict:
+    """Per-symbol frames from a ``group_by="ticker"`` download."""
+    if raw is None or raw.empty:
+        return {}
+    if not isinstance(raw.columns, pd.MultiIndex):
+        return {symbols[0]: raw}
+    have = set(raw.columns.get_level_values(0))
+    return {s: raw[s] for s in symbols if s in have}
+
+
+def fetch_chunk(symbols: list, start=None) -> dict:
+    raw = provider.download(symbols, interval=args.interval, start=start,
+                            period=None if start else args.period, group_by="ticker")
+    return split_frames(raw, symbols)
 
-for t in tickers:
+
+def plan(tickers: list, manifest: dict):
+    """Split tickers into skipped, incremental chunks (with a start) and full-history chunks."""
+    now = time.time()
+    skip, incr, full = [], [], []
+    for t in tickers:
+        # e.g. a year stored by the API doesn't satisfy --period 10y: backfill it
+        if not price_store.covers(t, args.interval, args.period):
+            full.append((t, None))
+            continue
+        done = manifest["done"].get(t)
+        if done and now - done["at"] < args.max_age:
+            skip.append(t)
+            continue
+        last = price_store.last_bar(t, args.interval)
+        (incr if last is not None else full).append((t, last))
+    chunks = []
+    # symbols with similar last bars share a download that starts at the oldest of them, a few
+    # days early so every symbol gets stored completed bars back to check for re-adjustment
+    incr.sort(key=lambda x: x[1].tz_localize(None))
+    for i in range(0, len(incr), args.chunk):
+        part = incr[i:i + args.chunk]
+        start = part[0][1].tz_localize(None).normalize() - pd.Timedelta(days=OVERLAP_DAYS)
+        chunks.append(([t for t, _ in part], start.date().isoformat()))
+    for i in range(0, len(full), args.chunk):
+        chunks.append(([t for t, _ in full[i:i + args.chunk]], None))
+    return skip, chunks
+
+
+def run_chunk(symbols: list, start, manifest: dict, summary: dict):
     try:
-        df = yf.download(t, period=args.period, interval=args.interval, auto_adjust=True, progress=False)
-        if df is None or df.empty or "Close" not in df:
+        frames = fetch_chunk(symbols, start)
+    except Exception as e:
+        frames, err = {}, f"{type(e).__name__}: {e}"
+    else:
+        err = "No data returned"
+    for s in symbols:
+        df = frames.get(s)
+        try:
+            if df is None or df.dropna(how="all").empty:
+                raise ValueError(err)
+            stored = price_store.ingest(s, args.interval, df, period=None if start else args.period)
+        except Exception as e:
+            with _lock:
+                manifest["failed"][s] = str(e)
+                summary["failed"] += 1
             continue
-        df.index.name = "Date"
-        out = DATA / f"{t}_{args.period}_{args.interval}.{args.fmt}"
-        if args.fmt == "parquet":
-            df.to_parquet(out)
-        else:
-            df.to_csv(out)
-        print(out)
-    except Exception:
-        pass
+        with _lock:
+            manifest["done"][s] = {"last": stored.index[-1].isoformat(), "rows": int(len(stored)), "at": time.time()}
+            manifest["failed"].pop(s, None)
+            summary["ok"] += 1
+            summary["bars"] += int(len(df.dropna(how="all")))
+    with _lock:
+        save_manifest(manifest)
+        n = summary["ok"] + summary["failed"]
+        print(f"[{n}/{summary['todo']}] {len(symbols)} symbols ({'from ' + start if start else args.period})", flush=True)
+
+
+def main():
+    tickers = list(dict.fromkeys(l.strip().upper() for l in open(args.tickers) if l.strip()))
+    manifest = load_manifest()
+    skip, chunks = plan(tickers, manifest)
+    summary = {"ok": 0, "failed": 0, "bars": 0, "todo": sum(len(c) for c, _ in chunks)}
+    print(f"{len(tickers)} tickers: {len(skip)} up to date, {summary['todo']} to fetch in {len(chunks)} chunks")
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
+        futs = [ex.submit(run_chunk, syms, start, manifest, summary) for syms, start in chunks]
+        for f in as_completed(futs):
+            f.result()
+    dt = time.perf_counter() - t0
+
+    rate = summary["ok"] / dt if dt > 0 else 0.0
+    print(f"\nfetched {summary['ok']} symbols ({summary['bars']} bars) in {dt:.1f}s, {rate:.1f} symbols/s")
+    print(f"skipped {len(skip)} fresh, failed {summary['failed']}")
+    for s in sorted(s for s in manifest["failed"] if s in set(tickers)):
+        print(f"  [fail] {s}: {manifest['failed'][s]}")
+    print(f"store: {Path(PRICE_STORE_DIR) / args.interval}  manifest: {MANIFEST}")
+    return 1 if summary["failed"] and not summary["ok"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
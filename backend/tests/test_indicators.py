@@ -0,0 +1,143 @@
+"""Streaming indicator engines and IndicatorStream vs the batch pandas features."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services import indicators
+from app.services.features import add_features, make_features
+from app.services.indicators import (
+    BacktestFeatureEngine, GlobalFeatureEngine, IndicatorStream, compute_features, run_engine,
+)
+from app.services.price_store import PriceStore
+
+KINDS = ["backtest", "global"]
+
+
+class _Offline:
+    name = "offline"
+
+    def download(self, *a, **kw):
+        raise AssertionError("the tests never hit the provider")
+
+
+def synthetic(rows: int = 400, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, rows)))
+    idx = pd.bdate_range("2015-01-02", periods=rows, name="Date")
+    return pd.DataFrame({
+        "Open": close * (1 + rng.normal(0, 0.003, rows)),
+        "High": close * 1.01, "Low": close * 0.99, "Close": close,
+        "Volume": rng.integers(1_000, 1_000_000, rows).astype("float64"),
+    }, index=idx)
+
+
+def batch(bars: pd.DataFrame, kind: str) -> pd.DataFrame:
+    return add_features(bars) if kind == "backtest" else make_features(bars)
+
+
+def assert_matches(got: pd.DataFrame, want: pd.DataFrame):
+    want = want[got.columns]
+    assert got.index.equals(want.index)
+    np.testing.assert_allclose(got.to_numpy("float64"), want.to_numpy("float64"),
+                               rtol=1e-7, atol=1e-9, equal_nan=True)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PriceStore(tmp_path, provider=_Offline())
+
+
+# ----- engines -----
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_one_bar_at_a_time_matches_batch(kind):
+    bars = synthetic()
+    assert_matches(compute_features(bars, kind), batch(bars, kind))
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_nan_volume(kind):
+    bars = synthetic()
+    bars.iloc[[5, 60, 61, 200], bars.columns.get_loc("Volume")] = np.nan
+    assert_matches(compute_features(bars, kind), batch(bars, kind))
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_zero_prices(kind):
+    bars = synthetic()
+    bars.iloc[[100, 250], :4] = 0.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        want = batch(bars, kind)
+    assert_matches(compute_features(bars, kind), want)
+
+
+@pytest.mark.parametrize("cls", [BacktestFeatureEngine, GlobalFeatureEngine])
+def test_state_round_trip(cls):
+    bars = synthetic()
+    head, tail = bars.iloc[:250], bars.iloc[250:]
+    engine = cls()
+    run_engine(engine, head)
+    restored = cls()
+    restored.set_state(engine.state())
+    np.testing.assert_array_equal(restored.state(), engine.state())
+    assert_matches(run_engine(restored, tail), run_engine(engine, tail))
+
+
+def test_state_of_wrong_size_is_rejected():
+    with pytest.raises(ValueError):
+        BacktestFeatureEngine().set_state(GlobalFeatureEngine().state())
+
+
+# ----- checkpointed stream -----
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_stream_appends_match_batch(store, kind):
+    bars = synthetic()
+    stream = IndicatorStream(store)
+    store.ingest("SYN", "1d", bars.iloc[:350])
+    stream.features("SYN", "1d", kind)
+    for i in range(350, len(bars)):
+        store.ingest("SYN", "1d", bars.iloc[i:i + 1])
+        got = stream.features("SYN", "1d", kind, tail=50)
+    want = batch(bars, kind)
+    assert len(got) == 50
+    assert_matches(got, want.iloc[-50:])
+    assert_matches(stream.features("SYN", "1d", kind), want)
+    assert stream.recomputed == 1
+    assert stream.appended == len(bars)
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_revised_last_bar_rolls_back(store, kind):
+    bars = synthetic()
+    stream = IndicatorStream(store)
+    store.ingest("SYN", "1d", bars)
+    stream.features("SYN", "1d", kind)
+    revised = bars.copy()
+    revised.iloc[-1, revised.columns.get_loc("Close")] *= 1.01
+    store.ingest("SYN", "1d", revised.iloc[-1:])
+    assert_matches(stream.features("SYN", "1d", kind), batch(revised, kind))
+    assert stream.rolled_back == 1
+    assert stream.recomputed == 1
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_checkpoint_survives_restart(store, kind):
+    bars = synthetic()
+    store.ingest("SYN", "1d", bars.iloc[:300])
+    IndicatorStream(store).features("SYN", "1d", kind)
+    store.ingest("SYN", "1d", bars.iloc[300:])
+    stream = IndicatorStream(store)   # nothing memoised: resumes from the files on disk
+    assert_matches(stream.features("SYN", "1d", kind, start=bars.index[320]), batch(bars, kind).loc[bars.index[320]:])
+    assert stream.recomputed == 0
+    assert stream.appended == len(bars) - 300
+
+
+def test_checkpoint_of_another_version_is_recomputed(store, monkeypatch):
+    bars = synthetic()
+    store.ingest("SYN", "1d", bars)
+    IndicatorStream(store).features("SYN", "1d", "global")
+    monkeypatch.setattr(indicators, "CKPT_VERSION", indicators.CKPT_VERSION + 1)
+    stream = IndicatorStream(store)
+    assert_matches(stream.features("SYN", "1d", "global"), batch(bars, "global"))
+    assert stream.recomputed == 1